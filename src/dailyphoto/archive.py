@@ -0,0 +1,89 @@
+import datetime
+import hashlib
+import logging
+import os
+
+from jinja2 import Environment
+from pydantic import BaseModel
+
+from .output import Output
+from .output import read_page_state
+from .output import write_page_state
+from .types import MonthlyImage
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = "archive"
+
+
+def archive_filename(year: int) -> str:
+    return f"{ARCHIVE_DIR}/{year}.html"
+
+
+class ArchiveMonth(BaseModel):
+    title: str
+    link: str
+    images: list[MonthlyImage] = []
+
+
+class ArchiveTemplate(BaseModel):
+    year: int
+    # (year, link) for every year, to jump between them
+    years: list[tuple[int, str]]
+    prev: str
+    next: str
+    months: list[ArchiveMonth]
+
+
+class ArchiveIndex:
+    """
+    Groups the day pages by the year they were published (unlike the year facet, which is the year taken)
+    and writes a page per year, so every day is two links from any page.
+    """
+
+    def __init__(self) -> None:
+        # year -> month -> the days published that month
+        self.years: dict[int, dict[int, ArchiveMonth]] = {}
+
+    def add(self, day: datetime.datetime, month_link: str, image: MonthlyImage) -> None:
+        months = self.years.setdefault(day.year, {})
+        month = months.get(day.month)
+        if month is None:
+            month = months[day.month] = ArchiveMonth(title=day.strftime("%B"), link=month_link)
+        month.images.append(image)
+
+    def write(self, env: Environment, output: Output, state_file: str, shared: str) -> None:
+        """
+        Write the year pages, skipping any whose inputs match the last build, so adding a day
+        only re-renders the current year. See FacetIndex.write for shared.
+        """
+        template = env.get_template("archive.html")
+        if env.loader is not None:
+            shared += env.loader.get_source(env, "archive.html")[0]
+
+        years = sorted(self.years)
+        links = [(year, f"/{archive_filename(year)}") for year in years]
+        old_state = read_page_state(state_file)
+        state = {}
+        rendered = 0
+        for i, year in enumerate(years):
+            name = archive_filename(year)
+            page = ArchiveTemplate(
+                year=year,
+                years=links,
+                prev=links[i - 1][1] if i > 0 else "",
+                next=links[i + 1][1] if i < len(years) - 1 else "",
+                months=[self.years[year][month] for month in sorted(self.years[year])],
+            )
+            signature = hashlib.sha256((shared + page.model_dump_json()).encode()).hexdigest()
+            state[name] = signature
+            unchanged = old_state.get(name) == signature and os.path.exists(output.path(name))
+            output.cached("pages", unchanged)
+            if unchanged:
+                output.keep(name)
+                continue
+            output.write(name, template.render(page.model_dump()))
+            rendered += 1
+
+        logger.info("Rendered %s of %s archive pages", rendered, len(state))
+        write_page_state(state_file, state)
@@ -0,0 +1,38 @@
+import hashlib
+import json
+import os
+
+# Fingerprinted files never change content under the same name, so they can be cached forever.
+# Everything else (html, rss) is left to the host's default of revalidating on every visit.
+IMMUTABLE = "Cache-Control: public, max-age=31536000, immutable"
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:8]
+
+
+def fingerprint(name: str, digest: str) -> str:
+    """
+    Insert the digest before the extension ie main.css -> main.3f2a9c1b.css
+    """
+    prefix, ext = os.path.splitext(name)
+    return f"{prefix}.{digest}{ext}"
+
+
+def headers(assets: dict[str, str], image_dir: str) -> str:
+    """
+    Build a _headers file (netlify / cloudflare pages format) marking fingerprinted assets immutable
+    """
+    # every image is fingerprinted so a single rule covers them
+    lines = [f"/{image_dir}/*", f"  {IMMUTABLE}"]
+    for name in sorted(assets.values()):
+        if not name.startswith(f"{image_dir}/"):
+            lines += [f"/{name}", f"  {IMMUTABLE}"]
+    return "\n".join(lines) + "\n"
+
+
+def manifest(assets: dict[str, str]) -> str:
+    """
+    Build assets.json mapping the original asset names to their fingerprinted names
+    """
+    return json.dumps(assets, indent=2, sort_keys=True) + "\n"
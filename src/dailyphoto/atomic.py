@@ -0,0 +1,141 @@
+import contextlib
+import logging
+import os
+import secrets
+import tempfile
+from collections.abc import Iterator
+from typing import BinaryIO
+
+logger = logging.getLogger(__name__)
+
+
+def _umask() -> int:
+    # the only way to read it is to set it, done once at import before any threads start
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+UMASK = _umask()
+
+
+def temp_prefix(filename: str) -> str:
+    """
+    Temporary files are hidden and named after the file they replace, mkstemp makes them unique so
+    two writers of one file never share a temporary file
+    """
+    return f".{os.path.basename(filename)}."
+
+
+def sync_dir(dirname: str) -> None:
+    """
+    fsync a directory so the renames into it survive a crash
+    """
+    fd = os.open(dirname or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class DirectorySync:
+    """
+    Collects the directories written into so each one is synced once at the end of a batch of writes
+    instead of after every file.
+    """
+
+    def __init__(self) -> None:
+        self.dirs: set[str] = set()
+
+    def add(self, filename: str) -> None:
+        self.dirs.add(os.path.dirname(filename))
+
+    def sync(self) -> None:
+        for dirname in sorted(self.dirs):
+            # a directory may have been emptied and removed since it was written to
+            with contextlib.suppress(FileNotFoundError):
+                sync_dir(dirname)
+        self.dirs.clear()
+
+
+@contextlib.contextmanager
+def atomic_open(filename: str, *, dirs: DirectorySync | None = None) -> Iterator[BinaryIO]:
+    """
+    Open filename for binary writing, so that it either keeps its old content or has all the new content.
+    Writes go to a temporary file which is synced and renamed over filename once the block finishes.
+    The directory is synced straight away unless dirs is given to batch it.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename) or ".", prefix=temp_prefix(filename), suffix=".tmp")
+    try:
+        with open(fd, "wb") as f:
+            # mkstemp creates the file private, give it the mode open() would have
+            os.fchmod(f.fileno(), 0o666 & ~UMASK)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, filename)
+    except BaseException:
+        # includes KeyboardInterrupt, the old file is still intact
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+    if dirs is None:
+        sync_dir(os.path.dirname(filename))
+    else:
+        dirs.add(filename)
+
+
+def atomic_symlink(link: str, filename: str, *, dirs: DirectorySync | None = None) -> None:
+    """
+    Point the symlink filename at link, replacing whatever is there atomically
+    """
+    dirname = os.path.dirname(filename) or "."
+    while True:
+        # mkstemp can't make a symlink, so pick a free name the same way
+        tmp = os.path.join(dirname, f"{temp_prefix(filename)}{secrets.token_hex(4)}.tmp")
+        try:
+            os.symlink(link, tmp)
+            break
+        except FileExistsError:
+            continue
+    try:
+        os.replace(tmp, filename)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+    if dirs is None:
+        sync_dir(os.path.dirname(filename))
+    else:
+        dirs.add(filename)
+
+
+def unchanged(filename: str, data: bytes) -> bool:
+    try:
+        if os.path.islink(filename) or os.path.getsize(filename) != len(data):
+            return False
+        with open(filename, "rb") as f:
+            return f.read() == data
+    except OSError:
+        return False
+
+
+def atomic_write(
+    filename: str,
+    data: bytes,
+    *,
+    only_if_changed: bool = False,
+    dirs: DirectorySync | None = None,
+) -> bool:
+    """
+    Atomically replace filename with data. Returns whether the file was written.
+    only_if_changed leaves a file that already has this content alone, keeping its mtime stable.
+    """
+    if only_if_changed and unchanged(filename, data):
+        logger.debug("Unchanged %s", filename)
+        return False
+    with atomic_open(filename, dirs=dirs) as f:
+        f.write(data)
+    return True
@@ -0,0 +1,477 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Protocol
+
+from . import config
+from .config import Site
+from .config import get_metadata_filename
+
+if TYPE_CHECKING:
+    from .types import Config
+    from .types import Date
+    from .types import Metadata
+    from .types import MetadataEditable
+
+# pydantic and the models are imported where the data is parsed, so a command that fails before reading
+# anything (ie no config) doesn't pay for them, see test_startup
+
+logger = logging.getLogger(__name__)
+
+SQLITE_EXTENSIONS = (".sqlite", ".sqlite3", ".db")
+METADATA_FIELDS = ("alt", "camera", "date", "film", "subtitle")
+
+
+class Catalogue(Protocol):
+    """
+    Where the archive state lives: the dates, which images are queued or current and their metadata.
+    The image files themselves always live on disk in the site's images and unused_images dirs.
+    """
+
+    def read_config(self) -> "Config | None": ...
+
+    def add_date(self, date: "Date") -> None:
+        """
+        Record date as published, adding it to the Config returned by read_config
+        """
+        ...
+
+    def read_metadata(self, image: str) -> "Metadata | None":
+        """
+        Metadata for a current (published) image
+        """
+        ...
+
+    def queued_images(self) -> list[str]: ...
+
+    def read_queued_metadata(self, image: str) -> "MetadataEditable | None":
+        """
+        Metadata for a queued image, which may not be filled in yet. None if there is none
+        """
+        ...
+
+    def queue_image(self, image: str) -> None:
+        """
+        Record a newly queued image
+        """
+        ...
+
+    def publish(self, image: str) -> None:
+        """
+        Move a queued image and its metadata to current
+        """
+        ...
+
+    def metadata_mtime(self, image: str) -> float | None:
+        """
+        When a current image's metadata last changed, for reproducible builds. None if unknown
+        """
+        ...
+
+    def sync_metadata(self, metadata_dir: str, state: str) -> int:
+        """
+        Pick up the metadata json files in metadata_dir after they were edited, see metadata.metadata.
+        Returns the number of files that couldn't be read
+        """
+        ...
+
+    def config_mtime(self) -> float | None:
+        """
+        When the dates last changed, for reproducible builds. None if unknown
+        """
+        ...
+
+
+def file_mtime(filename: str) -> float | None:
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+def file_stamp(filename: str) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class JsonCatalogue:
+    """
+    The original layout: config.json plus a json file per image in the metadata dirs.
+    Parsed files are kept until their size or mtime changes, so a long running process
+    (see daemon) only re-reads what was edited.
+    """
+
+    def __init__(self, config_file: str, site: Site) -> None:
+        self.config_file = config_file
+        self.site = site
+        self._config_stamp: tuple[int, int] | None = None
+        self._config: Config | None = None
+        # metadata file -> (stamp, parsed metadata)
+        self._metadata: dict[str, tuple[tuple[int, int], Metadata]] = {}
+
+    def read_config(self) -> "Config | None":
+        stamp = file_stamp(self.config_file)
+        if self._config is None or stamp != self._config_stamp:
+            self._config = config.read_config(self.config_file)
+            self._config_stamp = stamp
+        return self._config
+
+    def add_date(self, date: "Date") -> None:
+        conf = self.read_config()
+        if conf is None:
+            return
+        conf.dates.append(date)
+        logger.info("Writing %s", self.config_file)
+        config.write_config(self.config_file, conf)
+
+    def read_metadata(self, image: str) -> "Metadata | None":
+        metadata_file = get_metadata_filename(self.site.metadata_dir, image)
+        stamp = file_stamp(metadata_file)
+        cached = self._metadata.get(metadata_file)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        from .metadata import read_metadata
+
+        metadata = read_metadata(metadata_file)
+        if metadata is not None and stamp is not None:
+            self._metadata[metadata_file] = (stamp, metadata)
+        return metadata
+
+    def queued_images(self) -> list[str]:
+        return os.listdir(self.site.unused_images)
+
+    def read_queued_metadata(self, image: str) -> "MetadataEditable | None":
+        metadata_file = get_metadata_filename(self.site.unused_metadata, image)
+        if not os.path.exists(metadata_file):
+            return None
+        return _read_editable(metadata_file)
+
+    def queue_image(self, image: str) -> None:
+        # the image being in the queued dir is all that's needed
+        pass
+
+    def publish(self, image: str) -> None:
+        old_metadata_file = get_metadata_filename(self.site.unused_metadata, image)
+        if os.path.exists(old_metadata_file):
+            new_metadata_file = get_metadata_filename(self.site.metadata_dir, image)
+            logger.info("Moving %s to %s", old_metadata_file, new_metadata_file)
+            shutil.move(old_metadata_file, new_metadata_file)
+        else:
+            logger.warning("%s does not exist, no need to move", old_metadata_file)
+
+    def metadata_mtime(self, image: str) -> float | None:
+        return file_mtime(get_metadata_filename(self.site.metadata_dir, image))
+
+    def sync_metadata(self, metadata_dir: str, state: str) -> int:  # noqa: ARG002
+        # the json files are the catalogue
+        return 0
+
+    def config_mtime(self) -> float | None:
+        return file_mtime(self.config_file)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS dates (
+    day TEXT PRIMARY KEY,
+    filename TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS images (
+    filename TEXT PRIMARY KEY,
+    state TEXT NOT NULL CHECK (state IN ('queued', 'current'))
+);
+CREATE INDEX IF NOT EXISTS images_state ON images (state);
+CREATE TABLE IF NOT EXISTS metadata (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL CHECK (state IN ('queued', 'current')),
+    alt TEXT,
+    camera TEXT,
+    date TEXT,
+    film TEXT,
+    subtitle TEXT,
+    extra TEXT,
+    -- unix time the metadata was last written
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS metadata_film ON metadata (film);
+CREATE INDEX IF NOT EXISTS metadata_camera ON metadata (camera);
+CREATE INDEX IF NOT EXISTS metadata_date ON metadata (date);
+-- the fields of Config besides dates, ie base_url
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def metadata_name(image: str) -> str:
+    """
+    Metadata is keyed like the json files, by the image name without extension
+    """
+    return os.path.splitext(os.path.basename(image))[0]
+
+
+class SqliteCatalogue:
+    """
+    The archive state in a single SQLite database with indexed tables.
+    Every change is a small transaction instead of rewriting config.json.
+    """
+
+    def __init__(self, db_file: str) -> None:
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._config: Config | None = None
+        self._data_version: int | None = None
+
+    def read_config(self) -> "Config | None":
+        # data_version changes when another connection commits, ie a command run without the daemon
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._config = None
+            self._data_version = data_version
+        if self._config is None:
+            from pydantic import ValidationError
+
+            from .types import Config
+            from .types import Date
+
+            try:
+                rows = self.conn.execute("SELECT day, filename FROM dates ORDER BY day")
+                settings = dict(self.conn.execute("SELECT name, value FROM settings").fetchall())
+                self._config = Config.model_validate(
+                    {**settings, "dates": [Date.model_validate(dict(row)) for row in rows]},
+                )
+            except (sqlite3.Error, ValidationError) as e:
+                logger.error("Unable to load catalogue: %s. %s", self.db_file, e)
+                return None
+        return self._config
+
+    def add_date(self, date: "Date") -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO dates (day, filename) VALUES (?, ?)",
+                (date.model_dump()["day"], date.filename),
+            )
+            self.conn.execute(
+                "INSERT INTO images (filename, state) VALUES (?, 'current') "
+                "ON CONFLICT (filename) DO UPDATE SET state = 'current'",
+                (date.filename,),
+            )
+        if self._config is not None:
+            self._config.dates.append(date)
+
+    def _metadata_row(self, name: str, state: str) -> dict[str, Any] | None:
+        row = self.conn.execute("SELECT * FROM metadata WHERE name = ? AND state = ?", (name, state)).fetchone()
+        if row is None:
+            return None
+        fields = {field: row[field] for field in METADATA_FIELDS if row[field] is not None}
+        if row["extra"]:
+            fields.update(json.loads(row["extra"]))
+        return fields
+
+    def read_metadata(self, image: str) -> "Metadata | None":
+        fields = self._metadata_row(metadata_name(image), "current")
+        if fields is None:
+            logger.error("Unable to load metadata: %s not in %s", image, self.db_file)
+            return None
+        from pydantic import ValidationError
+
+        from .types import Metadata
+
+        try:
+            return Metadata.model_validate(fields)
+        except ValidationError as e:
+            logger.error("Unable to load metadata: %s. %s", image, e)
+            return None
+
+    def read_editable_metadata(self, name: str, state: str) -> "MetadataEditable | None":
+        """
+        name is the key the metadata is stored under, see metadata_name
+        """
+        fields = self._metadata_row(name, state)
+        if fields is None:
+            return None
+        from .types import MetadataEditable
+
+        return MetadataEditable.model_validate(fields)
+
+    def write_metadata(
+        self,
+        image: str,
+        state: str,
+        metadata: "Metadata | MetadataEditable",
+        *,
+        updated: float | None = None,
+    ) -> None:
+        """
+        updated defaults to now, import passes the json file's mtime
+        """
+        fields = metadata.model_dump()
+        extra = {key: value for key, value in fields.items() if key not in METADATA_FIELDS}
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO metadata (name, state, alt, camera, date, film, subtitle, extra, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    metadata_name(image),
+                    state,
+                    *(fields.get(field) for field in METADATA_FIELDS),
+                    json.dumps(extra) if extra else None,
+                    time.time() if updated is None else updated,
+                ),
+            )
+
+    def queued_images(self) -> list[str]:
+        return [row[0] for row in self.conn.execute("SELECT filename FROM images WHERE state = 'queued'")]
+
+    def read_queued_metadata(self, image: str) -> "MetadataEditable | None":
+        return self.read_editable_metadata(metadata_name(image), "queued")
+
+    def queue_image(self, image: str) -> None:
+        with self.conn:
+            self.conn.execute("INSERT OR IGNORE INTO images (filename, state) VALUES (?, 'queued')", (image,))
+
+    def publish(self, image: str) -> None:
+        with self.conn:
+            self.conn.execute("UPDATE images SET state = 'current' WHERE filename = ?", (image,))
+            cursor = self.conn.execute(
+                "UPDATE metadata SET state = 'current' WHERE name = ?",
+                (metadata_name(image),),
+            )
+        if cursor.rowcount == 0:
+            logger.warning("No metadata for %s in %s", image, self.db_file)
+
+    def metadata_mtime(self, image: str) -> float | None:
+        row = self.conn.execute(
+            "SELECT updated FROM metadata WHERE name = ? AND state = 'current'",
+            (metadata_name(image),),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def config_mtime(self) -> float | None:
+        # commits land in the write ahead log until it's checkpointed into the db
+        mtimes = [mtime for mtime in (file_mtime(self.db_file), file_mtime(f"{self.db_file}-wal")) if mtime]
+        return max(mtimes, default=None)
+
+    def sync_metadata(self, metadata_dir: str, state: str) -> int:
+        """
+        Store the json files in metadata_dir edited since their metadata was last written, returns the number
+        that couldn't be read
+        """
+        updated = {row["name"]: row["updated"] for row in self.conn.execute("SELECT name, updated FROM metadata")}
+        ret = 0
+        for name in _list_images(metadata_dir):
+            if not name.endswith(".json"):
+                continue
+            metadata_file = os.path.join(metadata_dir, name)
+            mtime = file_mtime(metadata_file)
+            last = updated.get(metadata_name(name))
+            if mtime is not None and last is not None and mtime <= last:
+                continue
+            metadata = _read_editable(metadata_file)
+            if metadata is None:
+                ret += 1
+                continue
+            logger.info("Storing %s in %s", metadata_file, self.db_file)
+            self.write_metadata(name, state, metadata, updated=mtime)
+        return ret
+
+    def metadata_names(self, state: str) -> list[str]:
+        return [row[0] for row in self.conn.execute("SELECT name FROM metadata WHERE state = ?", (state,))]
+
+
+def open_catalogue(config_file: str, site: Site) -> Catalogue:
+    """
+    Pick the backend from the config file name, SQLite for .sqlite/.db files otherwise json
+    """
+    if config_file.endswith(SQLITE_EXTENSIONS):
+        return SqliteCatalogue(config_file)
+    return JsonCatalogue(config_file, site)
+
+
+def _list_images(image_dir: str) -> list[str]:
+    if not os.path.isdir(image_dir):
+        return []
+    return sorted(os.listdir(image_dir))
+
+
+def _read_editable(metadata_file: str) -> "MetadataEditable | None":
+    from pydantic import ValidationError
+
+    from .types import MetadataEditable
+
+    try:
+        with open(metadata_file) as c:
+            return MetadataEditable.model_validate(json.load(c))
+    except (json.decoder.JSONDecodeError, ValidationError) as e:
+        logger.error("Unable to load metadata: %s. %s", metadata_file, e)
+        return None
+
+
+def import_catalogue(*, conf: "Config", site: Site, db_file: str) -> int:
+    """
+    Merge config.json, the image dirs and the metadata json files into the SQLite catalogue db_file.
+    Nothing is deleted: dates already in the catalogue are kept, images take the state of the dir they're in
+    and metadata is only replaced by json files edited since it was last written.
+    """
+    catalogue = SqliteCatalogue(db_file)
+    with catalogue.conn:
+        cursor = catalogue.conn.executemany(
+            "INSERT OR IGNORE INTO dates (day, filename) VALUES (?, ?)",
+            ((date.model_dump()["day"], date.filename) for date in conf.dates),
+        )
+        added = cursor.rowcount
+        catalogue.conn.executemany(
+            "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)",
+            conf.model_dump(exclude={"dates"}, exclude_defaults=True).items(),
+        )
+        for state, image_dir in (("current", site.images), ("queued", site.unused_images)):
+            catalogue.conn.executemany(
+                "INSERT INTO images (filename, state) VALUES (?, ?) "
+                "ON CONFLICT (filename) DO UPDATE SET state = excluded.state",
+                ((image, state) for image in _list_images(image_dir)),
+            )
+
+    ret = 0
+    for state, metadata_dir in (("current", site.metadata_dir), ("queued", site.unused_metadata)):
+        ret += catalogue.sync_metadata(metadata_dir, state)
+
+    logger.info("Imported %s new dates into %s", added, db_file)
+    return ret
+
+
+def export_catalogue(*, site: Site, db_file: str, config_file: str) -> int:
+    """
+    Write the SQLite catalogue db_file back out as config_file and metadata json files
+    """
+    if not os.path.exists(db_file):
+        logger.error("Unable to load catalogue: %s does not exist", db_file)
+        return 1
+    catalogue = SqliteCatalogue(db_file)
+    conf = catalogue.read_config()
+    if conf is None:
+        return 1
+    from .metadata import write_metadata
+
+    config.write_config(config_file, conf)
+
+    for state, metadata_dir in (("current", site.metadata_dir), ("queued", site.unused_metadata)):
+        os.makedirs(metadata_dir, exist_ok=True)
+        for name in catalogue.metadata_names(state):
+            metadata = catalogue.read_editable_metadata(name, state)
+            if metadata is not None:
+                # name is already without the extension, ie IMG.1234 for IMG.1234.jpg
+                write_metadata(os.path.join(metadata_dir, f"{name}.json"), metadata)
+
+    logger.info("Exported %s dates from %s to %s", len(conf.dates), db_file, config_file)
+    return 0
@@ -1,26 +1,55 @@
 import argparse
-import logging
+import sys
+from typing import TYPE_CHECKING
 
-from . import config
-from .exif import print_exif
-from .generate import generate
-from .metadata import metadata
-from .new import new
-from .queued import queue_images
-from .validate import validate
+from .client import FORWARDED
+from .client import forward
+from .logs import LOG_FORMATS
+from .logs import setup_logging
 
+if TYPE_CHECKING:
+    from .daemon import WarmState
 
-def main(argv: list[str] | None = None) -> int:
+# Subcommands are imported when they run, so short commands like exif and validate
+# don't pay for importing jinja2, Pillow or pydantic models they never use.
+
+
+def image_quality(value: str) -> int | str:
+    if value in ("keep", "lossless"):
+        return value
+    quality = int(value)
+    if not 1 <= quality <= 95:
+        raise argparse.ArgumentTypeError("quality must be between 1 and 95, keep or lossless")
+    return quality
+
+
+def main(argv: list[str] | None = None, *, warm: "WarmState | None" = None) -> int:
+    """
+    warm is set when the daemon runs a forwarded command, and supplies its long lived catalogue and caches
+    """
     parser = argparse.ArgumentParser(description="generate todays pic site")
     parser.add_argument(
         "--config-file",
-        help="Path to config file. defaults to ./config.json",
+        help="Path to config file. defaults to ./config.json. A .sqlite or .db file uses the SQLite catalogue",
         default="config.json",
     )
     parser.add_argument(
         "--verbose",
-        help="Set log level to info",
-        action="store_true",
+        help="Set log level to info, twice to debug which logs every file",
+        action="count",
+        default=0,
+    )
+    parser.add_argument(
+        "--log-format",
+        choices=LOG_FORMATS,
+        default="text",
+        help="json logs one object per line with any structured fields. defaults to text",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        help="Run here even if a daemon is serving this directory",
+        dest="daemon",
+        action="store_false",
     )
     subparsers = parser.add_subparsers(dest="function")
     sp = subparsers.add_parser(
@@ -28,10 +57,53 @@ def main(argv: list[str] | None = None) -> int:
         help="default: Generate static site suitable for gh pages",
     )
     sp.add_argument("--no-tar", default=True, dest="tar", action="store_false", help="Disable creation of tarball")
+    sp.add_argument("--minify", action="store_true", help="Minify html, css and js before writing")
+    sp.add_argument("--inline-css", action="store_true", help="Inline the stylesheets into each page")
+    sp.add_argument(
+        "--fonts-dir",
+        help="optional. Self host the fonts in this directory as subset woff2 instead of using google fonts",
+    )
+    sp.add_argument(
+        "--optimize-images",
+        action="store_true",
+        help="Publish progressive web copies of the images with EXIF stripped instead of the originals",
+    )
+    sp.add_argument(
+        "--image-quality",
+        type=image_quality,
+        default=85,
+        help="JPEG quality for --optimize-images, keep to reuse the original quantization, or lossless to copy the "
+        "compressed image as is with only the metadata stripped. defaults to 85",
+    )
+    sp.add_argument(
+        "--max-edge",
+        type=int,
+        help="optional. Scale --optimize-images copies down so the long edge is at most this many pixels",
+    )
+    sp.add_argument(
+        "--sites",
+        nargs="+",
+        metavar="CONFIG_FILE",
+        help="optional. Build the site next to each config file concurrently instead of --config-file. "
+        "Any name but config.json is a shard of the archive next to it, ie 2023.json -> generated-2023",
+    )
+
+    sp.add_argument(
+        "--reproducible",
+        action="store_true",
+        help="Take every timestamp from the inputs, clamped to SOURCE_DATE_EPOCH, so unchanged inputs build "
+        "byte identical output and tarball. Implied when SOURCE_DATE_EPOCH is set",
+    )
+    sp.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="optional. Write build metrics (pages/s, bytes written, cache hit rate, errors) to FILE as JSON, "
+        "or for Prometheus' textfile collector if it ends in .prom",
+    )
 
     sp = subparsers.add_parser(
         "new",
-        help=f"choose and add new image from {config.UNUSED_IMAGES} for YYYYMMDD",
+        help="choose and add new image from queued/images for YYYYMMDD",
     )
     sp.add_argument(
         "--dates",
@@ -41,13 +113,29 @@ def main(argv: list[str] | None = None) -> int:
     sp.add_argument(
         "--images",
         nargs="*",
-        help="optional. list of specific images instead of random",
+        help="optional. list of specific images instead of scheduled ones",
+    )
+    sp.add_argument(
+        "--spacing",
+        type=int,
+        default=7,
+        help="Don't repeat a film stock or camera within this many days. defaults to 7",
+    )
+    sp.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the planned dates and images without adding them",
     )
 
     sp = subparsers.add_parser(
         "validate",
         help="validate config.json",
     )
+    sp.add_argument(
+        "--published",
+        metavar="PATH",
+        help="Instead, check a deployed copy of the site (directory or tarball) against the last build",
+    )
     sp = subparsers.add_parser(
         "metadata",
         help="Update image metadata alongside the image",
@@ -81,6 +169,26 @@ def main(argv: list[str] | None = None) -> int:
         nargs="*",
     )
 
+    sp = subparsers.add_parser(
+        "catalogue",
+        help="Copy the archive between --config-file + metadata json and a SQLite catalogue",
+    )
+    sp.add_argument(
+        "direction",
+        choices=["import", "export"],
+        help="import: json -> SQLite. export: SQLite -> json",
+    )
+    sp.add_argument(
+        "db_file",
+        help="Path to the SQLite catalogue",
+    )
+
+    sp = subparsers.add_parser(
+        "daemon",
+        help="Keep config, metadata and templates loaded and run exif, generate, new, queue and validate for "
+        "other dailyphoto invocations in this directory",
+    )
+
     sp = subparsers.add_parser(
         "watch",
         help="Watch [path] for changes and generate",
@@ -93,52 +201,134 @@ def main(argv: list[str] | None = None) -> int:
 
     args = parser.parse_args(argv)
 
-    if args.verbose:
-        logging.basicConfig(
-            level=logging.INFO,
-            format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        )
-    else:
-        logging.basicConfig(
-            level=logging.ERROR,
-            format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+    setup_logging(verbose=args.verbose, log_format=args.log_format)
+
+    if warm is None and args.daemon and args.function in FORWARDED:
+        ret = forward(sys.argv[1:] if argv is None else argv, args.verbose, args.log_format)
+        if ret is not None:
+            return ret
+
+    if args.function == "daemon":
+        from .daemon import daemon
+
+        return daemon(config_file=args.config_file)
+
+    if args.function == "exif":
+        # works on any image, no config needed
+        from .exif import print_exif
+
+        return print_exif(args.images)
+
+    if args.function == "generate" and args.sites:
+        from .generate import generate_sites
+
+        return generate_sites(
+            config_files=args.sites,
+            tar=args.tar,
+            minify=args.minify,
+            inline_css=args.inline_css,
+            fonts_dir=args.fonts_dir,
+            optimize=args.optimize_images,
+            image_quality=args.image_quality,
+            max_edge=args.max_edge,
+            metrics_file=args.metrics,
+            reproducible=args.reproducible,
         )
 
-    conf = config.read_config(args.config_file)
+    from .catalogue import open_catalogue
+    from .config import Site
+
+    # --config-file is read from the current directory and the site is laid out around it
+    site = Site()
+    if args.function == "catalogue" and args.direction == "export":
+        from .catalogue import export_catalogue
+
+        # the json config is the output so it may not exist yet
+        return export_catalogue(site=site, db_file=args.db_file, config_file=args.config_file)
+
+    if warm is None:
+        catalogue = open_catalogue(args.config_file, site)
+    else:
+        catalogue = warm.catalogue(args.config_file, site)
+    conf = catalogue.read_config()
     if conf is None:
         return 1
 
     if args.function == "new":
+        from .new import new
+
         return new(
             images=args.images,
             dates=args.dates,
-            config_file=args.config_file,
+            site=site,
+            catalogue=catalogue,
+            spacing=args.spacing,
+            dry_run=args.dry_run,
         )
     elif args.function == "validate":
-        return validate(conf=conf)
+        if args.published:
+            from .integrity import verify_published
+
+            return verify_published(site=site, published=args.published)
+        from .validate import validate
+
+        return validate(site=site, conf=conf, catalogue=catalogue)
     elif args.function == "metadata":
+        from .metadata import metadata
+
         return metadata(
+            site=site,
             conf=conf,
+            catalogue=catalogue,
             always_edit=args.always_edit,
             source_dir=args.source_dir,
         )
     elif args.function == "queue":
+        from .queued import queue_images
+
         return queue_images(
+            site=site,
             conf=conf,
+            catalogue=catalogue,
             source_dir=args.source_dir,
         )
-    elif args.function == "exif":
-        return print_exif(args.images)
     elif args.function == "generate":
-        return generate(conf=conf, tar=args.tar)
+        from .generate import generate
+        from .metrics import BuildMetrics
+        from .metrics import write_metrics
+
+        metrics: list[BuildMetrics] = []
+        ret = generate(
+            site=site,
+            conf=conf,
+            catalogue=catalogue,
+            tar=args.tar,
+            minify=args.minify,
+            inline_css=args.inline_css,
+            fonts_dir=args.fonts_dir,
+            optimize=args.optimize_images,
+            image_quality=args.image_quality,
+            max_edge=args.max_edge,
+            template_cache=None if warm is None else warm.template_cache,
+            image_index=None if warm is None else warm.image_index(site),
+            metrics=metrics,
+            reproducible=args.reproducible,
+        )
+        if args.metrics:
+            write_metrics(args.metrics, metrics)
+        return ret
     elif args.function == "watch":
         try:
             from dailyphoto.watch import watch
 
-            return watch(conf=conf, path=args.path)
+            return watch(site=site, config_file=args.config_file, path=args.path)
         except ImportError:
             print("Watch unavaiable without watchdog module")
             return 1
+    elif args.function == "catalogue":
+        from .catalogue import import_catalogue
+
+        return import_catalogue(conf=conf, site=site, db_file=args.db_file)
     else:
         parser.parse_args(["-h"])
         return 1
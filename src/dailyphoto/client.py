@@ -0,0 +1,45 @@
+import json
+import os
+import socket
+import sys
+
+# config.CACHE_DIR/daemon.sock, spelled out so forwarding a command doesn't import config and pydantic
+SOCKET = os.path.join(".dailyphoto-cache", "daemon.sock")
+
+# commands the daemon runs, the rest are interactive or long running
+FORWARDED = ("exif", "generate", "new", "queue", "validate")
+# environment variables that change what a command does, the daemon runs the command with the client's values
+FORWARDED_ENV = ("SOURCE_DATE_EPOCH",)
+
+
+def forward(argv: list[str], verbose: int, log_format: str) -> int | None:
+    """
+    Run argv on the daemon serving the current directory and return its exit code,
+    or None if no daemon is running so the command should run here instead
+    """
+    if not os.path.exists(SOCKET):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(SOCKET)
+            request = {
+                "argv": argv,
+                "verbose": verbose,
+                "log_format": log_format,
+                "env": {name: os.environ.get(name) for name in FORWARDED_ENV},
+            }
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            sock.shutdown(socket.SHUT_WR)
+            with sock.makefile("rb") as f:
+                reply = json.load(f)
+    except (ConnectionRefusedError, FileNotFoundError):
+        # left behind by a daemon that didn't shut down cleanly, or removed as it shut down
+        return None
+    except json.JSONDecodeError:
+        # the daemon went away before replying
+        return None
+
+    sys.stdout.write(reply["stdout"])
+    sys.stderr.write(reply["stderr"])
+    ret: int = reply["ret"]
+    return ret
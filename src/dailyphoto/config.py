@@ -1,9 +1,13 @@
-import functools
+import glob
 import json
 import logging
 import os
+from typing import TYPE_CHECKING
 
-from .types import Config
+from .atomic import atomic_write
+
+if TYPE_CHECKING:
+    from .types import Config
 
 logger = logging.getLogger(__name__)
 
@@ -14,26 +18,140 @@ IMAGES = "current/images"
 METADATA_DIR = "current/metadata"
 OUTPUT_DIR = "generated"
 OUTPUT_IMAGES = "images"
+CACHE_DIR = ".dailyphoto-cache"
+INDEX_FILE = os.path.join(CACHE_DIR, "index.json")
+FACETS_FILE = os.path.join(CACHE_DIR, "facets.json")
+ARCHIVE_FILE = os.path.join(CACHE_DIR, "archive.json")
+HASHES_FILE = os.path.join(CACHE_DIR, "hashes.json")
+SITEMAP_FILE = os.path.join(CACHE_DIR, "sitemap.json")
+OPTIMIZED_DIR = os.path.join(CACHE_DIR, "images")
+TARBALL = "dailyphoto.tar.gz"
+
+
+class Site:
+    """
+    Build context for one site: where its images, metadata, cache and output live.
+    The constants above are the layout inside root. Sites sharing a root (ie yearly shards of
+    one archive) share its images and cache, and get their own output through suffix.
+    A plain class, every command builds one before reading any data so it mustn't import pydantic.
+    """
+
+    def __init__(self, *, root: str = ".", suffix: str = "") -> None:
+        self.root = root
+        self.suffix = suffix
+
+    def __repr__(self) -> str:
+        return f"Site(root={self.root!r}, suffix={self.suffix!r})"
+
+    @classmethod
+    def for_config(cls, config_file: str) -> "Site":
+        """
+        The site laid out next to config_file. Any name but config.json is a shard ie 2023.json -> generated-2023
+        """
+        name = os.path.splitext(os.path.basename(config_file))[0]
+        return cls(
+            root=os.path.dirname(config_file) or ".",
+            suffix="" if name == "config" else f"-{name}",
+        )
+
+    def path(self, name: str) -> str:
+        return os.path.normpath(os.path.join(self.root, name))
+
+    @property
+    def images(self) -> str:
+        return self.path(IMAGES)
+
+    @property
+    def metadata_dir(self) -> str:
+        return self.path(METADATA_DIR)
+
+    @property
+    def unused(self) -> str:
+        return self.path(UNUSED)
+
+    @property
+    def unused_images(self) -> str:
+        return self.path(UNUSED_IMAGES)
+
+    @property
+    def unused_metadata(self) -> str:
+        return self.path(UNUSED_METADATA)
+
+    @property
+    def output_dir(self) -> str:
+        return self.path(OUTPUT_DIR + self.suffix)
 
+    @property
+    def output_dirs(self) -> list[str]:
+        """
+        The output of every site sharing root, shards included
+        """
+        return sorted(glob.glob(self.path(OUTPUT_DIR) + "*"))
 
-@functools.cache
-def read_config(config_file: str) -> Config | None:
+    @property
+    def cache_dir(self) -> str:
+        return self.path(CACHE_DIR)
+
+    @property
+    def optimized_dir(self) -> str:
+        # web copies made by --optimize-images, shared by every site under root
+        return self.path(OPTIMIZED_DIR)
+
+    @property
+    def index_file(self) -> str:
+        return self.path(INDEX_FILE)
+
+    @property
+    def facets_file(self) -> str:
+        base, ext = os.path.splitext(FACETS_FILE)
+        return self.path(f"{base}{self.suffix}{ext}")
+
+    @property
+    def archive_file(self) -> str:
+        base, ext = os.path.splitext(ARCHIVE_FILE)
+        return self.path(f"{base}{self.suffix}{ext}")
+
+    @property
+    def sitemap_file(self) -> str:
+        base, ext = os.path.splitext(SITEMAP_FILE)
+        return self.path(f"{base}{self.suffix}{ext}")
+
+    @property
+    def hashes_file(self) -> str:
+        # keyed by real path, so shards share it like the image index
+        return self.path(HASHES_FILE)
+
+    @property
+    def tarball(self) -> str:
+        return self.path(TARBALL.replace(".tar.gz", f"{self.suffix}.tar.gz"))
+
+
+def get_metadata_filename(metadata_dir: str, image: str) -> str:
+    return os.path.join(
+        metadata_dir,
+        os.path.splitext(os.path.basename(image))[0] + ".json",
+    )
+
+
+def read_config(config_file: str) -> "Config | None":
     try:
         with open(config_file) as c:
             parsed = json.load(c)
-            return Config.model_validate(parsed)
+        # imported once there's a config to validate, see cli
+        from .types import Config
+
+        return Config.model_validate(parsed)
 
     except (FileNotFoundError, json.decoder.JSONDecodeError) as e:
-        logger.error(f"Unable to load config_file: {config_file}. {e}")
+        logger.error("Unable to load config_file: %s. %s", config_file, e)
         return None
 
 
-def write_config(config_file: str, config: Config) -> None:
+def write_config(config_file: str, config: "Config") -> None:
     try:
-        with open(config_file, "w") as c:
-            c.write(config.model_dump_json(indent=2))
-            # include a final line ending
-            c.write("\n")
+        # include a final line ending, settings left at their defaults aren't written out
+        content = config.model_dump_json(indent=2, exclude_defaults=True) + "\n"
+        atomic_write(config_file, content.encode(), only_if_changed=True)
 
     except OSError as e:
-        logger.error(f"Unable to write config_file: {config_file}. {e}")
+        logger.error("Unable to write config_file: %s. %s", config_file, e)
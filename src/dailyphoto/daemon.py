@@ -0,0 +1,196 @@
+import contextlib
+import importlib
+import io
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import time
+from collections.abc import Iterator
+from types import FrameType
+
+from .catalogue import Catalogue
+from .catalogue import open_catalogue
+from .cli import main
+from .client import SOCKET
+from .config import Site
+from .generate import TEMPLATE_EXTENSIONS
+from .generate import TemplateCache
+from .generate import environment
+from .index import ImageIndex
+from .index import read_index
+from .index import write_index
+from .logs import formatter
+from .logs import log_level
+
+logger = logging.getLogger(__name__)
+
+# the modules behind the forwarded commands, which cli.main otherwise imports on first use
+WARM_MODULES = ("exif", "generate", "new", "queued", "validate")
+
+
+class WarmState:
+    """
+    Everything the daemon keeps between commands: the catalogues with their parsed config and metadata,
+    compiled templates and image indexes. The catalogues re-read any file whose mtime changed,
+    so edits made outside the daemon are picked up by the next command.
+    """
+
+    def __init__(self) -> None:
+        self.template_cache = TemplateCache()
+        self.catalogues: dict[str, Catalogue] = {}
+        self.image_indexes: dict[str, ImageIndex] = {}
+
+    def catalogue(self, config_file: str, site: Site) -> Catalogue:
+        if config_file not in self.catalogues:
+            self.catalogues[config_file] = open_catalogue(config_file, site)
+        return self.catalogues[config_file]
+
+    def image_index(self, site: Site) -> ImageIndex:
+        if site.index_file not in self.image_indexes:
+            self.image_indexes[site.index_file] = read_index(site.index_file)
+        return self.image_indexes[site.index_file]
+
+    def save(self) -> None:
+        """
+        Write the image indexes out so commands run without the daemon still benefit
+        """
+        for index_file, image_index in self.image_indexes.items():
+            write_index(index_file, image_index)
+
+    def warm_up(self, config_file: str, site: Site) -> None:
+        start = time.perf_counter()
+        for module in WARM_MODULES:
+            importlib.import_module(f".{module}", __package__)
+        env = environment(self.template_cache)
+        # resources is a package, so skip its __init__.py and __pycache__
+        for name in env.list_templates(extensions=TEMPLATE_EXTENSIONS):
+            env.get_template(name)
+        catalogue = self.catalogue(config_file, site)
+        conf = catalogue.read_config()
+        if conf is not None:
+            for date in conf.dates:
+                catalogue.read_metadata(date.filename)
+        self.image_index(site)
+        logger.info("Warmed up in %.3fs", time.perf_counter() - start)
+
+
+@contextlib.contextmanager
+def client_env(env: dict[str, str | None]) -> Iterator[None]:
+    """
+    Run with the client's values of FORWARDED_ENV, commands run one at a time so this can change os.environ
+    """
+    saved = {name: os.environ.get(name) for name in env}
+    try:
+        for name, value in env.items():
+            set_env(name, value)
+        yield
+    finally:
+        for name, value in saved.items():
+            set_env(name, value)
+
+
+def set_env(name: str, value: str | None) -> None:
+    if value is None:
+        os.environ.pop(name, None)
+    else:
+        os.environ[name] = value
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    server: "DaemonServer"
+
+    def handle(self) -> None:
+        request = json.loads(self.rfile.readline())
+        reply = self.server.run(
+            request["argv"],
+            request["verbose"],
+            request.get("log_format", "text"),
+            request.get("env", {}),
+        )
+        self.wfile.write(json.dumps(reply).encode())
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Runs forwarded commands one at a time in this process, capturing their logs and output for the client
+    """
+
+    def __init__(self, socket_file: str, warm: WarmState) -> None:
+        super().__init__(socket_file, DaemonHandler)
+        self.warm = warm
+
+    def run(self, argv: list[str], verbose: int, log_format: str, env: dict[str, str | None]) -> dict[str, str | int]:
+        start = time.perf_counter()
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        handler = logging.StreamHandler(stderr)
+        handler.setFormatter(formatter(log_format))
+        handler.setLevel(log_level(verbose))
+        root = logging.getLogger()
+        level = root.level
+        root.addHandler(handler)
+        root.setLevel(min(level, handler.level))
+        try:
+            with contextlib.redirect_stdout(stdout), client_env(env):
+                ret = main(argv, warm=self.warm)
+        except SystemExit as e:
+            ret = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            logger.exception("Failed to run %s", argv)
+            ret = 1
+        finally:
+            root.removeHandler(handler)
+            root.setLevel(level)
+        self.warm.save()
+        logger.info("Ran %s in %.3fs", argv, time.perf_counter() - start)
+        return {"ret": ret, "stdout": stdout.getvalue(), "stderr": stderr.getvalue()}
+
+
+def running() -> bool:
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(SOCKET)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+
+
+def stop(_signum: int, _frame: FrameType | None) -> None:
+    # shut down like Ctrl-C so the socket is removed
+    raise KeyboardInterrupt
+
+
+def daemon(*, config_file: str) -> int:
+    """
+    Serve commands for the site in the current directory over SOCKET until interrupted
+    """
+    if running():
+        logger.error("A daemon is already serving %s", SOCKET)
+        return 1
+    with contextlib.suppress(FileNotFoundError):
+        # stale, from a daemon that didn't shut down cleanly
+        os.remove(SOCKET)
+
+    # the daemon's own log keeps the level it was started with, whatever the clients ask for
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.setLevel(root.level)
+
+    site = Site()
+    os.makedirs(site.cache_dir, exist_ok=True)
+    warm = WarmState()
+    warm.warm_up(config_file, site)
+
+    signal.signal(signal.SIGTERM, stop)
+    with DaemonServer(SOCKET, warm) as server:
+        print(f"Serving on {SOCKET}, Ctrl-C to stop")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.remove(SOCKET)
+    return 0
@@ -1,11 +1,14 @@
 import logging
 from datetime import datetime
+from typing import TYPE_CHECKING
 
 from PIL import Image
 from PIL.ExifTags import TAGS
 from PIL.ExifTags import Base
 
-from .types import MetadataEditable
+if TYPE_CHECKING:
+    # only needed for annotations, keeps pydantic out of `dailyphoto exif`
+    from .types import MetadataEditable
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +21,34 @@ def print_exif(image_files: list[str]) -> int:
                 if exif_data is not None:
                     for tag_id, value in exif_data.items():
                         tag = TAGS.get(tag_id, tag_id)
-                        logger.info(f"{tag}: {value}")
+                        logger.info("%s: %s", tag, value)
                     for tag_id, value in exif_data.get_ifd(
                         Image.ExifTags.IFD.Exif,
                     ).items():
                         tag = TAGS.get(tag_id, tag_id)
-                        logger.info(f"{tag}: {value}")
+                        logger.info("%s: %s", tag, value)
                 else:
-                    logger.warning(f"No EXIF data found for {image}.")
+                    logger.warning("No EXIF data found for %s.", image)
         except Exception as e:
-            logger.error(f"Error reading EXIF data from {image}: {e}")
+            logger.error("Error reading EXIF data from %s: %s", image, e)
     return 0
 
 
-def exif_to_metadata(image_file: str, metadata: MetadataEditable) -> None:
+def image_size(image_file: str) -> tuple[int, int]:
+    """
+    Return the displayed (width, height) of image_file, only reading the header.
+    Accounts for the EXIF orientation so portrait photos shot sideways come out portrait.
+    """
+    with Image.open(image_file) as image:
+        width, height = image.size
+        orientation = image.getexif().get(Base["Orientation"], 1)
+    # orientations 5-8 are rotated by 90 degrees
+    if orientation in (5, 6, 7, 8):
+        return height, width
+    return width, height
+
+
+def exif_to_metadata(image_file: str, metadata: "MetadataEditable") -> None:
     with Image.open(image_file) as image:
         exif_data = image.getexif()
     if exif_data is None:
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+from collections import defaultdict
+
+from jinja2 import Environment
+from pydantic import BaseModel
+
+from .output import Output
+from .output import read_page_state
+from .output import write_page_state
+from .search import tokenize
+from .types import Metadata
+from .types import MonthlyImage
+
+logger = logging.getLogger(__name__)
+
+# facet kind -> heading used on the pages
+FACETS = {
+    "film": "Film",
+    "camera": "Camera",
+    "year": "Taken in",
+}
+PAGE_SIZE = 60
+
+
+def slug(value: str) -> str:
+    """
+    URL safe name for a facet value ie Kodak Portra 400 -> kodak-portra-400, accents are stripped the same way
+    as search so Ōlympus XA -> olympus-xa. A value with no letters or digits left gets a short hash instead.
+    """
+    return "-".join(tokenize(value)) or hashlib.sha256(value.encode()).hexdigest()[:8]
+
+
+def facet_filename(kind: str, key: str, page: int) -> str:
+    if page == 1:
+        return f"{kind}/{key}.html"
+    # slugs never contain a . so page numbers can't collide with another value
+    return f"{kind}/{key}.{page}.html"
+
+
+class Facet(BaseModel):
+    kind: str
+    key: str
+    name: str
+    images: list[MonthlyImage] = []
+
+    @property
+    def pages(self) -> int:
+        return (len(self.images) + PAGE_SIZE - 1) // PAGE_SIZE
+
+
+class FacetTemplate(BaseModel):
+    title: str
+    page: int
+    pages: int
+    prev: str
+    next: str
+    images: list[MonthlyImage]
+
+
+class FacetSummary(BaseModel):
+    link: str
+    name: str
+    count: int
+
+
+class FacetIndex:
+    """
+    Groups day pages by film, camera and year taken in a single pass over the metadata,
+    then writes a paginated grid per facet value plus a browse page of the counts.
+    """
+
+    def __init__(self) -> None:
+        self.facets: dict[tuple[str, str], Facet] = {}
+
+    def _facet(self, kind: str, name: str) -> Facet:
+        key = slug(name)
+        facet = self.facets.get((kind, key))
+        if facet is None:
+            facet = self.facets[(kind, key)] = Facet(kind=kind, key=key, name=name)
+        return facet
+
+    def add(self, metadata: Metadata, image: MonthlyImage) -> None:
+        self._facet("film", metadata.film).images.append(image)
+        self._facet("camera", metadata.camera).images.append(image)
+        self._facet("year", str(metadata.date.year)).images.append(image)
+
+    def write(self, env: Environment, output: Output, state_file: str, shared: str) -> None:
+        """
+        Write the facet pages, skipping any page whose inputs match the last build.
+        shared identifies everything outside the page (stylesheets, flags) that also changes its output.
+        """
+        template = env.get_template("facet.html")
+        if env.loader is not None:
+            # changing the template changes every page
+            shared += env.loader.get_source(env, "facet.html")[0]
+
+        old_state = read_page_state(state_file)
+        state = {}
+        rendered = 0
+        for facet in self.facets.values():
+            for page in range(1, facet.pages + 1):
+                name = facet_filename(facet.kind, facet.key, page)
+                page_template = FacetTemplate(
+                    title=f"{FACETS[facet.kind]} {facet.name}",
+                    page=page,
+                    pages=facet.pages,
+                    prev=f"/{facet_filename(facet.kind, facet.key, page - 1)}" if page > 1 else "",
+                    next=f"/{facet_filename(facet.kind, facet.key, page + 1)}" if page < facet.pages else "",
+                    images=facet.images[(page - 1) * PAGE_SIZE : page * PAGE_SIZE],
+                )
+                signature = hashlib.sha256((shared + page_template.model_dump_json()).encode()).hexdigest()
+                state[name] = signature
+                unchanged = old_state.get(name) == signature and os.path.exists(output.path(name))
+                output.cached("pages", unchanged)
+                if unchanged:
+                    output.keep(name)
+                    continue
+                output.write(name, template.render(page_template.model_dump()))
+                rendered += 1
+
+        logger.info("Rendered %s of %s facet pages", rendered, len(state))
+        write_page_state(state_file, state)
+
+        summaries: dict[str, list[FacetSummary]] = defaultdict(list)
+        for facet in sorted(self.facets.values(), key=lambda f: f.name):
+            summaries[facet.kind].append(
+                FacetSummary(
+                    link=f"/{facet_filename(facet.kind, facet.key, 1)}",
+                    name=facet.name,
+                    count=len(facet.images),
+                ),
+            )
+        output.write(
+            "browse.html",
+            env.get_template("browse.html").render(
+                facets=[(FACETS[kind], summaries[kind]) for kind in FACETS],
+            ),
+        )
@@ -0,0 +1,102 @@
+import io
+import logging
+import os
+
+from pydantic import BaseModel
+
+from .output import Output
+
+logger = logging.getLogger(__name__)
+
+FONTS_DIR = "fonts"
+FONT_EXTENSIONS = (".ttf", ".otf", ".woff", ".woff2")
+# The same latin range google fonts serves, enough for everything on the site
+LATIN = (
+    "U+0000-00FF,U+0131,U+0152-0153,U+02BB-02BC,U+02C6,U+02DA,U+02DC,U+0304,U+0308,U+0329,"
+    "U+2000-206F,U+20AC,U+2122,U+2191,U+2193,U+2212,U+2215,U+FEFF,U+FFFD"
+)
+
+
+class Font(BaseModel):
+    family: str
+    style: str
+    weight: str
+    file: str
+
+
+def subset_font(font_file: str) -> tuple[Font, bytes]:
+    """
+    Subset font_file to LATIN and convert it to woff2.
+    Returns the description of the font (with the file unset) and the woff2 data
+    """
+    from fontTools import subset
+    from fontTools.ttLib import TTFont
+
+    # keep the head timestamp so the same font always produces the same fingerprint
+    font = TTFont(font_file, recalcTimestamp=False)
+    family = font["name"].getBestFamilyName()
+    # bit 0 of fsSelection is italic
+    style = "italic" if font["OS/2"].fsSelection & 1 else "normal"
+    if "fvar" in font:
+        # variable fonts cover a range of weights
+        wght = next(axis for axis in font["fvar"].axes if axis.axisTag == "wght")
+        weight = f"{int(wght.minValue)} {int(wght.maxValue)}"
+    else:
+        weight = str(font["OS/2"].usWeightClass)
+
+    options = subset.Options()
+    options.flavor = "woff2"
+    options.layout_features = ["*"]
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=subset.parse_unicodes(LATIN))
+    subsetter.subset(font)
+
+    data = io.BytesIO()
+    font.flavor = "woff2"
+    font.save(data)
+    return Font(family=family, style=style, weight=weight, file=""), data.getvalue()
+
+
+def self_host_fonts(fonts_dir: str, output: Output, assets: dict[str, str]) -> list[Font] | None:
+    """
+    Subset every font in fonts_dir into the output fonts dir, recording them in assets
+    """
+    try:
+        import brotli  # noqa: F401
+        import fontTools  # noqa: F401
+    except ImportError:
+        logger.error("Self hosting fonts requires the fonttools and brotli modules, install dailyphoto[fonts]")
+        return None
+
+    if not os.path.isdir(fonts_dir):
+        logger.error("Unable to list fonts dir: %s", fonts_dir)
+        return None
+
+    fonts = []
+    for name in sorted(os.listdir(fonts_dir)):
+        prefix, ext = os.path.splitext(name)
+        if ext.lower() not in FONT_EXTENSIONS:
+            continue
+        font, data = subset_font(os.path.join(fonts_dir, name))
+        asset = os.path.join(FONTS_DIR, prefix + ".woff2")
+        font.file = assets[asset] = output.write_asset(asset, data)
+        logger.info("Subset %s to %s: %s %s %s", name, font.file, font.family, font.style, font.weight)
+        fonts.append(font)
+    return fonts
+
+
+def font_faces(fonts: list[Font]) -> str:
+    """
+    Return @font-face rules for fonts
+    """
+    return "".join(
+        "@font-face {\n"
+        f'  font-family: "{font.family}";\n'
+        f"  font-style: {font.style};\n"
+        f"  font-weight: {font.weight};\n"
+        "  font-display: swap;\n"
+        f'  src: url("/{font.file}") format("woff2");\n'
+        f"  unicode-range: {LATIN};\n"
+        "}\n"
+        for font in fonts
+    )
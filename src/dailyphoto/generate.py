@@ -1,28 +1,75 @@
 import datetime
+import functools
+import gzip
+import json
 import logging
+import multiprocessing
 import os
-import shutil
-import sys
 import tarfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from logging.handlers import QueueListener
+from typing import TYPE_CHECKING
 from typing import Annotated
 
+from jinja2 import BytecodeCache
 from jinja2 import Environment
 from jinja2 import PackageLoader
 from jinja2 import select_autoescape
+from jinja2.bccache import Bucket
 from pydantic import BaseModel
 from pydantic import PlainSerializer
 
-from .config import IMAGES
-from .config import METADATA_DIR
-from .config import OUTPUT_DIR
+from .archive import ArchiveIndex
+from .archive import archive_filename
+from .assets import headers
+from .assets import manifest
+from .atomic import atomic_open
+from .catalogue import Catalogue
+from .catalogue import open_catalogue
 from .config import OUTPUT_IMAGES
-from .config import Config
-from .metadata import get_metadata_filename
-from .metadata import read_metadata
+from .config import Site
+from .facets import FacetIndex
+from .facets import slug
+from .fonts import font_faces
+from .fonts import self_host_fonts
+from .images import SiteImages
+from .index import ImageIndex
+from .index import read_index
+from .index import write_index
+from .integrity import HashCache
+from .integrity import read_hash_cache
+from .integrity import write_hash_cache
+from .integrity import write_manifest
+from .logs import Forward
+from .logs import Progress
+from .logs import count_errors
+from .logs import log_to_queue
+from .metrics import BuildMetrics
+from .metrics import write_metrics
+from .optimize import optimize_images
+from .optimize import prune_optimized
+from .output import Output
+from .reproducible import SOURCE_DATE_EPOCH
+from .reproducible import InputTimes
+from .reproducible import build_epoch
+from .reproducible import check_source_date_epoch
+from .reproducible import set_source_date_epoch
+from .reproducible import source_date_epoch
+from .search import SearchIndex
+from .sitemap import write_sitemap
+from .types import Config
 from .types import Metadata
+from .types import MonthlyImage
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
 
 logger = logging.getLogger(__name__)
 
+# the files in resources that are templates, the rest is the package's own
+TEMPLATE_EXTENSIONS = ("html", "xml", "css", "js")
+
 
 def format_filename(output_dir: str, day: datetime.datetime) -> str:
     return os.path.join(output_dir, f"{day.strftime('%Y%m%d')}.html")
@@ -33,18 +80,14 @@ class DailyTemplate(BaseModel):
     yesterday: str
     tomorrow: str
     image: str
+    width: int
+    height: int
+    # neighbouring pages and their images for the browser to fetch while idle
+    prefetch: list[str]
     metadata: Metadata
 
-    def write(self, env: Environment, output_name: str) -> None:
-        html_content = env.get_template("template.html").render(self)
-        with open(output_name, "w") as f:
-            f.write(html_content)
-
-
-class MonthlyImage(BaseModel):
-    link: str
-    file: str
-    alt: str
+    def write(self, env: Environment, output: Output, output_name: str, mtime: int | None) -> None:
+        output.write(output_name, env.get_template("template.html").render(self), mtime=mtime)
 
 
 def monthly_filename(month: datetime.datetime | None) -> str:
@@ -59,11 +102,8 @@ class MonthlyTemplate(BaseModel):
     next: Annotated[datetime.datetime | None, PlainSerializer(monthly_filename)] = None
     images: list[MonthlyImage] = []
 
-    def write(self, env: Environment) -> None:
-        monthly_file = os.path.join(OUTPUT_DIR, monthly_filename(self.month))
-        logger.info(f"Writing {monthly_file}")
-        with open(monthly_file, "w") as f:
-            f.write(env.get_template("month.html").render(self.model_dump()))
+    def write(self, env: Environment, output: Output) -> None:
+        output.write(monthly_filename(self.month), env.get_template("month.html").render(self.model_dump()))
 
 
 def rss_date(date: datetime.datetime) -> str:
@@ -86,11 +126,8 @@ class RSSFeed(BaseModel):
     date: Annotated[datetime.datetime, PlainSerializer(rss_date)]
     entries: list[RSSEntry]
 
-    def write(self, env: Environment) -> None:
-        rss_file = os.path.join(OUTPUT_DIR, "rss.xml")
-        logger.info(f"Writing {rss_file}")
-        with open(rss_file, "w") as rss:
-            rss.write(env.get_template("rss.xml").render(self.model_dump()))
+    def write(self, env: Environment, output: Output) -> None:
+        output.write("rss.xml", env.get_template("rss.xml").render(self.model_dump()))
 
 
 def photo_date(date: datetime.datetime) -> str:
@@ -104,115 +141,166 @@ def generate_day(
     prev_day: datetime.datetime,
     current_day: datetime.datetime,
     next_day: datetime.datetime,
+    prev_image: str,
     image: str,
-    metadata_file: str,
+    next_image: str,
+    catalogue: Catalogue,
     index: bool,
-    output_dir: str,
+    output: Output,
     rss_feed: RSSFeed,
+    search: SearchIndex,
+    facets: FacetIndex,
+    archive: ArchiveIndex,
     month: MonthlyTemplate,
-) -> None:
+    images: SiteImages,
+    mtime: int | None,
+) -> int:
     if index:
-        output_name = os.path.join(output_dir, "index.html")
+        output_name = "index.html"
     else:
-        output_name = format_filename(output_dir, current_day)
-
-    logger.info(f"Writing {output_name}")
+        output_name = format_filename("", current_day)
 
-    metadata = read_metadata(metadata_file)
+    metadata = catalogue.read_metadata(image)
     if metadata is None:
-        logger.error(f"Unable to parse {metadata_file} date: {current_day}")
-        # TODO: error handling shouldn't be immediate exit. need to better
-        # collect and bubble errors
-        sys.exit(1)
-
-    # symlink this days image to the output directory
-    intput_image = os.path.join("..", "..", IMAGES, image)
-    output_image = os.path.join(output_dir, OUTPUT_IMAGES, image)
-    if not os.path.exists(output_image):
-        if os.path.lexists(output_image):
-            # fix broken links
-            os.remove(output_image)
-        os.symlink(intput_image, output_image)
+        logger.error("Unable to parse metadata for %s date: %s", image, current_day)
+        return 1
 
+    # symlink this days image to the output directory under its fingerprinted name
+    image_file = images.asset(image)
+    info = images.info(image)
+    output.symlink(image_file, images.source(image))
+
+    yesterday = format_filename("/", prev_day)
     tomorrow = format_filename("/", next_day)
     if next_day == conf.dates[-1].day:
         tomorrow = "index.html"
 
+    prefetch = []
+    # the first and last days link to themselves, no need to fetch those again
+    if prev_day != current_day:
+        prefetch += [yesterday, images.asset(prev_image)]
+    if next_day != current_day:
+        prefetch += [tomorrow, images.asset(next_image)]
+
     DailyTemplate(
         date=current_day,
-        yesterday=format_filename("/", prev_day),
+        yesterday=yesterday,
         tomorrow=tomorrow,
-        image=os.path.join(OUTPUT_IMAGES, image),
+        image=image_file,
+        width=info.width,
+        height=info.height,
+        prefetch=prefetch,
         metadata=metadata,
-    ).write(env, output_name)
+    ).write(env, output, output_name, mtime)
 
     if index:
         # index isn't included in the RSS feed
-        return
-
-    month.images.append(
-        MonthlyImage(
-            link=format_filename("/", current_day),
-            file=os.path.join(OUTPUT_IMAGES, image),
-            alt=metadata.alt,
-        ),
+        return 0
+
+    thumbnail = MonthlyImage(
+        link=format_filename("/", current_day),
+        file=image_file,
+        alt=metadata.alt,
+        width=info.width,
+        height=info.height,
     )
+    month.images.append(thumbnail)
+    facets.add(metadata, thumbnail)
+    archive.add(current_day, f"/{monthly_filename(month.month)}", thumbnail)
+
+    search.add(format_filename("/", current_day), image_file, photo_date(current_day), metadata)
 
     rss_feed.entries.append(
         RSSEntry(
             title=metadata.subtitle,
-            link=f"https://daily.photo/{current_day.strftime('%Y%m%d')}.html",
+            link=f"{conf.base_url}/{current_day.strftime('%Y%m%d')}.html",
             date=rss_date(current_day),
             alt=metadata.alt,
-            img_link=f"https://daily.photo/{OUTPUT_IMAGES}/{image}",
+            img_link=f"{conf.base_url}/{image_file}",
             subtitle=metadata.subtitle,
         ),
     )
+    return 0
 
 
-def setup_output_dir(env: Environment, output_dir: str) -> bool:
+def setup_output_dir(
+    env: Environment,
+    output: Output,
+    assets: dict[str, str],
+    inline_css: bool,
+    fonts_dir: str | None,
+) -> bool:
     """
-    Creates the output dir and links base files like CSS
+    Creates the output dir and writes base files like CSS under fingerprinted names.
+    Files from the previous build are left in place so unchanged pages can be kept, see Output.sweep
     """
-    # clear out previous dir if it exists
-    if os.path.exists(output_dir):
-        shutil.rmtree(output_dir)
-
-    logger.info(f"Creating {output_dir}")
-    os.mkdir(output_dir)
+    output_dir = output.output_dir
+    if not os.path.exists(output_dir):
+        logger.info("Creating %s", output_dir)
+        os.mkdir(output_dir)
 
     images = os.path.join(output_dir, OUTPUT_IMAGES)
     if not os.path.exists(images):
-        logger.info(f"Creating {images}")
+        logger.info("Creating %s", images)
         os.mkdir(images)
 
+    # @font-face rules for self hosted fonts go at the top of each stylesheet
+    css_prefix = ""
+    if fonts_dir is not None:
+        fonts = self_host_fonts(fonts_dir, output, assets)
+        if fonts is None:
+            return False
+        css_prefix = font_faces(fonts)
+        # only the upright faces are used by the pages, preload those
+        env.globals["fonts"] = [font.file for font in fonts if font.style == "normal"]
+
     untemplated_files = [
         "main.css",
         "main.js",
         "month.css",
     ]
 
+    styles = {}
     for file in untemplated_files:
-        filename = f"{output_dir}/{file}"
-        with open(filename, "w") as f:
-            logger.info(f"Creating {filename}")
-            f.write(env.get_template(file).render())
+        content = env.get_template(file).render()
+        if file.endswith(".css"):
+            content = css_prefix + content
+            styles[file] = content
+        assets[file] = output.write_asset(file, content)
+
+    if inline_css:
+        # the stylesheets are small enough to inline to avoid a blocking request
+        env.globals["styles"] = styles
 
     return True
 
 
-def create_tar_gz_with_symlinks(source_dir: str, output_filename: str) -> None:
+def create_tar_gz_with_symlinks(source_dir: str, output_filename: str, *, mtime: int | None = None) -> None:
     """
     Creates a tar.gz archive of the given directory.
     Resolve symlinks to their target.
+    With mtime the archive is reproducible: members keep the mtimes a reproducible build gave them,
+    clamped to mtime, are owned by root with normalised permissions, and the gzip header gets mtime.
     """
-    # remove old tar file
-    if os.path.exists(output_filename):
-        os.remove(output_filename)
 
-    with tarfile.open(output_filename, "w:gz") as tar:
-        for root, _, files in os.walk(source_dir):
-            for name in files:
+    def normalise(info: tarfile.TarInfo) -> tarfile.TarInfo:
+        if mtime is not None:
+            info.mtime = min(int(info.mtime), mtime)
+            info.uid = info.gid = 0
+            info.uname = info.gname = ""
+            info.mode = 0o755 if info.mode & 0o111 else 0o644
+        return info
+
+    # the old tar file stays in place until the new one is complete
+    with (
+        atomic_open(output_filename) as f,
+        gzip.GzipFile(os.path.basename(output_filename), "wb", fileobj=f, mtime=mtime) as gz,
+        tarfile.open(fileobj=gz, mode="w") as tar,
+    ):
+        # sorted so the order doesn't depend on the filesystem
+        for root, dirs, files in os.walk(source_dir):
+            dirs.sort()
+            for name in sorted(files):
                 full_path = os.path.join(root, name)
                 # Resolve symlinks to their targets
                 if os.path.islink(full_path):
@@ -220,85 +308,433 @@ def create_tar_gz_with_symlinks(source_dir: str, output_filename: str) -> None:
                     tar.add(
                         target_path,
                         arcname=os.path.relpath(full_path, start=source_dir),
+                        filter=normalise,
                     )
                 else:
                     tar.add(
                         full_path,
                         arcname=os.path.relpath(full_path, start=source_dir),
+                        filter=normalise,
                     )
+    if mtime is not None:
+        os.utime(output_filename, (mtime, mtime))
+
+
+class TemplateCache(BytecodeCache):
+    """
+    Keeps compiled templates in memory so the environments of several sites built together
+    compile each template once. Buckets are keyed on the template source so edits are picked up.
+    """
+
+    def __init__(self) -> None:
+        self.buckets: dict[str, bytes] = {}
+
+    def load_bytecode(self, bucket: Bucket) -> None:
+        code = self.buckets.get(bucket.key)
+        if code is not None:
+            bucket.bytecode_from_string(code)
+
+    def dump_bytecode(self, bucket: Bucket) -> None:
+        self.buckets[bucket.key] = bucket.bytecode_to_string()
+
+
+def environment(template_cache: TemplateCache | None = None) -> Environment:
+    """
+    Each site needs its own Environment as the globals (assets, styles, fonts) differ per site
+    """
+    env = Environment(
+        loader=PackageLoader("dailyphoto", "resources"),
+        autoescape=select_autoescape(["html", "xml"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        bytecode_cache=template_cache,
+    )
+    env.filters["slug"] = slug
+    return env
+
+
+def generate(
+    *,
+    site: Site,
+    conf: Config,
+    catalogue: Catalogue,
+    tar: bool,
+    minify: bool = False,
+    inline_css: bool = False,
+    fonts_dir: str | None = None,
+    optimize: bool = False,
+    image_quality: int | str = 85,
+    max_edge: int | None = None,
+    template_cache: TemplateCache | None = None,
+    image_index: ImageIndex | None = None,
+    hash_cache: HashCache | None = None,
+    metrics: list[BuildMetrics] | None = None,
+    reproducible: bool = False,
+) -> int:
+    """
+    Build site, see generate_site, and log how the build went. The build's metrics are appended
+    to metrics for the caller to write out.
+    reproducible builds take every timestamp from their inputs, so unchanged inputs give byte identical output
+    """
+    if not check_source_date_epoch():
+        return 1
+    start = time.perf_counter()
+    output = Output(site.output_dir, minify=minify)
+    with count_errors() as errors:
+        ret = generate_site(
+            site=site,
+            conf=conf,
+            catalogue=catalogue,
+            output=output,
+            tar=tar,
+            minify=minify,
+            inline_css=inline_css,
+            fonts_dir=fonts_dir,
+            optimize=optimize,
+            image_quality=image_quality,
+            max_edge=max_edge,
+            template_cache=template_cache,
+            image_index=image_index,
+            hash_cache=hash_cache,
+            # SOURCE_DATE_EPOCH asks every tool in the build to be reproducible
+            reproducible=reproducible or source_date_epoch() is not None,
+        )
+    build = BuildMetrics.of(output, seconds=time.perf_counter() - start, errors=errors.count)
+    build.log()
+    if metrics is not None:
+        metrics.append(build)
+    return ret
+
 
+def generate_site(
+    *,
+    site: Site,
+    conf: Config,
+    catalogue: Catalogue,
+    output: Output,
+    tar: bool,
+    minify: bool,
+    inline_css: bool,
+    fonts_dir: str | None,
+    optimize: bool,
+    image_quality: int | str,
+    max_edge: int | None,
+    template_cache: TemplateCache | None,
+    image_index: ImageIndex | None,
+    hash_cache: HashCache | None,
+    reproducible: bool,
+) -> int:
+    """
+    Build site into output. image_index and hash_cache may be shared with other sites built at the same time,
+    in which case the caller reads and writes them, see generate_sites
+    """
+    if not conf.dates:
+        logger.error("No dates set in config for %s", site.output_dir)
+        return 1
 
-def generate(*, conf: Config, tar: bool) -> int:
-    env = Environment(loader=PackageLoader("dailyphoto", "resources"), autoescape=select_autoescape(["html", "xml"]))
+    env = environment(template_cache)
 
-    logger.info("Generating site")
-    if not setup_output_dir(env, OUTPUT_DIR):
+    logger.info("Generating site %s", site.output_dir)
+    # the footer's archive link goes to the latest year
+    archive_link = archive_filename(conf.dates[-1].day.year)
+    times = None
+    if reproducible:
+        # everything besides the source files that changes the output
+        options = json.dumps(
+            [minify, inline_css, fonts_dir, optimize, image_quality, max_edge, archive_link, conf.base_url],
+        )
+        times = InputTimes(site=site, catalogue=catalogue, env=env, extensions=TEMPLATE_EXTENSIONS, options=options)
+        # for the files that depend on the whole site, day pages get their own
+        output.mtime = times.newest(conf)
+    # maps asset names (main.css, images/foo.jpg) to their fingerprinted names for the templates
+    assets: dict[str, str] = {}
+    if not setup_output_dir(env, output, assets, inline_css, fonts_dir):
         return 1
+    env.globals["assets"] = assets
+    env.globals["archive"] = archive_link
+    env.globals["base_url"] = conf.base_url
 
-    rss_feed = RSSFeed(date=datetime.datetime.now(), entries=[])
+    if times is None:
+        updated = datetime.datetime.now()
+    else:
+        updated = datetime.datetime.fromtimestamp(build_epoch(conf), datetime.UTC).replace(tzinfo=None)
+    rss_feed = RSSFeed(date=updated, entries=[])
+    search = SearchIndex()
+    facets = FacetIndex()
+    archive = ArchiveIndex()
+    shared_index = image_index is not None
+    if image_index is None:
+        image_index = read_index(site.index_file)
+    images = SiteImages(site.images, OUTPUT_IMAGES, image_index, assets)
+
+    if optimize:
+        # publish web copies instead of the originals
+        originals = {date.filename: images.original(date.filename) for date in conf.dates}
+        digests = {image: images.info(image).digest for image in originals}
+        images.sources = optimize_images(
+            originals,
+            digests,
+            site.optimized_dir,
+            image_quality,
+            max_edge,
+        )
 
     dates = conf.dates
     month = MonthlyTemplate(month=dates[0].day)
+    progress = Progress(logger, "Rendered days", len(dates))
     for i, date in enumerate(dates):
         today = date.day
         curr_month = datetime.datetime(year=today.year, month=today.month, day=1)
         if curr_month != month.month:
             # New month, write and reset
             month.next = curr_month
-            month.write(env)
+            month.write(env, output)
             month = MonthlyTemplate(month=curr_month, prev=month.month)
 
-        metadata_file = get_metadata_filename(
-            METADATA_DIR,
-            date.filename,
-        )
-
         # Determine previous, current, and next days
         if i == 0:
-            prev_day = today
+            prev_date = date
         else:
-            prev_day = dates[i - 1].day
+            prev_date = dates[i - 1]
 
         if i == len(dates) - 1:
-            next_day = today
+            next_date = date
         else:
-            next_day = dates[i + 1].day
+            next_date = dates[i + 1]
+
+        mtime = None if times is None else times.day(prev_date.filename, date.filename, next_date.filename)
 
         if i == len(dates) - 1:
             # Last day we need to generate the index and no anchor
-            generate_day(
+            ret = generate_day(
                 env=env,
                 conf=conf,
-                prev_day=prev_day,
+                prev_day=prev_date.day,
                 current_day=today,
-                next_day=next_day,
+                next_day=next_date.day,
+                prev_image=prev_date.filename,
                 image=date.filename,
+                next_image=next_date.filename,
                 index=True,
-                metadata_file=metadata_file,
-                output_dir=OUTPUT_DIR,
+                catalogue=catalogue,
+                output=output,
                 rss_feed=rss_feed,
+                search=search,
+                facets=facets,
+                archive=archive,
                 month=month,
+                images=images,
+                mtime=mtime,
             )
+            if ret != 0:
+                return ret
 
-        generate_day(
+        ret = generate_day(
             env=env,
             conf=conf,
-            prev_day=prev_day,
+            prev_day=prev_date.day,
             current_day=today,
-            next_day=next_day,
+            next_day=next_date.day,
+            prev_image=prev_date.filename,
             image=date.filename,
+            next_image=next_date.filename,
             index=False,
-            metadata_file=metadata_file,
-            output_dir=OUTPUT_DIR,
+            catalogue=catalogue,
+            output=output,
             rss_feed=rss_feed,
+            search=search,
+            facets=facets,
+            archive=archive,
             month=month,
+            images=images,
+            mtime=mtime,
         )
+        if ret != 0:
+            # a page missing from the middle of the site would break its neighbours' links
+            return ret
+        progress.advance()
 
     # Write out the final month
-    month.write(env)
-
-    rss_feed.write(env)
+    month.write(env, output)
+
+    rss_feed.write(env, output)
+
+    search.write(output)
+    output.write("search.html", env.get_template("search.html").render())
+
+    # anything shared by the facet and archive pages that changes their output
+    shared = json.dumps(
+        [
+            assets["month.css"],
+            assets["main.js"],
+            env.globals.get("styles"),
+            env.globals.get("fonts"),
+            env.globals["archive"],
+            minify,
+        ],
+    )
+    facets.write(env, output, site.facets_file, shared)
+    archive.write(env, output, site.archive_file, shared)
+    # after every page is written or kept
+    write_sitemap(env, output, conf.base_url, site.sitemap_file)
+
+    output.write("_headers", headers(assets, OUTPUT_IMAGES))
+    output.write("assets.json", manifest(assets))
+    # last, so it covers every file of the build
+    shared_hashes = hash_cache is not None
+    if hash_cache is None:
+        hash_cache = read_hash_cache(site.hashes_file)
+    write_manifest(output, hash_cache)
+    output.sweep()
+    output.sync()
+    output.log_stats()
+    if not shared_index:
+        write_index(site.index_file, image_index)
+    if not shared_hashes:
+        write_hash_cache(site.hashes_file, hash_cache)
+    if not shared_index:
+        # otherwise other sites may still be linking to copies, generate_sites prunes once they're done
+        prune_optimized(site.optimized_dir, site.output_dirs)
 
     if tar:
-        create_tar_gz_with_symlinks(OUTPUT_DIR, "dailyphoto.tar.gz")
+        create_tar_gz_with_symlinks(site.output_dir, site.tarball, mtime=output.mtime)
     return 0
+
+
+class SiteBuild(BaseModel):
+    """
+    What a worker building one site of generate_sites sends back
+    """
+
+    ret: int
+    metrics: list[BuildMetrics]
+    image_index: ImageIndex
+    hash_cache: HashCache
+
+
+def build_site(
+    config_file: str,
+    site: Site,
+    image_index: ImageIndex,
+    hash_cache: HashCache,
+    *,
+    tar: bool,
+    minify: bool,
+    inline_css: bool,
+    fonts_dir: str | None,
+    optimize: bool,
+    image_quality: int | str,
+    max_edge: int | None,
+    reproducible: bool,
+) -> SiteBuild:
+    """
+    Build one site in a worker process of generate_sites. image_index and hash_cache are copies of the shared ones,
+    they come back with this site's entries added for the parent to merge.
+    """
+    metrics: list[BuildMetrics] = []
+    catalogue = open_catalogue(config_file, site)
+    conf = catalogue.read_config()
+    if conf is None:
+        ret = 1
+    else:
+        ret = generate(
+            site=site,
+            conf=conf,
+            catalogue=catalogue,
+            tar=tar,
+            minify=minify,
+            inline_css=inline_css,
+            fonts_dir=fonts_dir,
+            optimize=optimize,
+            image_quality=image_quality,
+            max_edge=max_edge,
+            image_index=image_index,
+            hash_cache=hash_cache,
+            metrics=metrics,
+            reproducible=reproducible,
+        )
+    return SiteBuild(ret=ret, metrics=metrics, image_index=image_index, hash_cache=hash_cache)
+
+
+def init_worker(records: "Queue[logging.LogRecord]", level: int, epoch: str | None) -> None:
+    log_to_queue(records, level)
+    # a forkserver's processes have the environment it started with, which in the daemon isn't the client's
+    set_source_date_epoch(epoch)
+
+
+def generate_sites(
+    *,
+    config_files: list[str],
+    tar: bool,
+    minify: bool = False,
+    inline_css: bool = False,
+    fonts_dir: str | None = None,
+    optimize: bool = False,
+    image_quality: int | str = 85,
+    max_edge: int | None = None,
+    metrics_file: str | None = None,
+    reproducible: bool = False,
+) -> int:
+    """
+    Build the site laid out next to each config file in a process per site, see Site.for_config.
+    Rendering holds the GIL, so threads would build one site at a time.
+    Sites with the same root share one image index and hash cache, read and written here once.
+    """
+    sites = [Site.for_config(config_file) for config_file in config_files]
+    outputs = [site.output_dir for site in sites]
+    if len(set(outputs)) != len(outputs):
+        logger.error("Sites must not share an output directory: %s", outputs)
+        return 1
+
+    image_indexes = {site.index_file: read_index(site.index_file) for site in sites}
+    hash_caches = {site.hashes_file: read_hash_cache(site.hashes_file) for site in sites}
+    build = functools.partial(
+        build_site,
+        tar=tar,
+        minify=minify,
+        inline_css=inline_css,
+        fonts_dir=fonts_dir,
+        optimize=optimize,
+        image_quality=image_quality,
+        max_edge=max_edge,
+        reproducible=reproducible,
+    )
+
+    # forkserver as in optimize_images, the daemon runs this with other threads alive
+    context = multiprocessing.get_context("forkserver")
+    records = context.Queue()
+    listener = QueueListener(records, Forward())
+    listener.start()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=min(len(sites), os.process_cpu_count() or 1),
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(records, logging.getLogger().getEffectiveLevel(), os.environ.get(SOURCE_DATE_EPOCH)),
+        ) as executor:
+            futures = [
+                executor.submit(build, config_file, site, image_indexes[site.index_file], hash_caches[site.hashes_file])
+                for config_file, site in zip(config_files, sites, strict=True)
+            ]
+            builds = [future.result() for future in futures]
+    finally:
+        listener.stop()
+
+    metrics: list[BuildMetrics] = []
+    for site, result in zip(sites, builds, strict=True):
+        image_indexes[site.index_file].images.update(result.image_index.images)
+        hash_caches[site.hashes_file].files.update(result.hash_cache.files)
+        metrics += result.metrics
+    for index_file, image_index in image_indexes.items():
+        write_index(index_file, image_index)
+    for hashes_file, hash_cache in hash_caches.items():
+        write_hash_cache(hashes_file, hash_cache)
+    for optimized_dir, site in {site.optimized_dir: site for site in sites}.items():
+        prune_optimized(optimized_dir, site.output_dirs)
+    if metrics_file:
+        write_metrics(metrics_file, metrics)
+
+    for config_file, result in zip(config_files, builds, strict=True):
+        if result.ret != 0:
+            logger.error("Failed to generate %s", config_file)
+    return sum(result.ret for result in builds)
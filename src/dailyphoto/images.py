@@ -0,0 +1,39 @@
+import os
+
+from .assets import fingerprint
+from .index import ImageIndex
+from .index import ImageInfo
+from .index import image_info
+
+
+class SiteImages:
+    """
+    Tracks the images published with the site: which file each one is published from
+    (the original or an optimized web copy) and the fingerprinted name it's published under.
+    """
+
+    def __init__(self, image_dir: str, output_images: str, image_index: ImageIndex, assets: dict[str, str]) -> None:
+        self.image_dir = image_dir
+        self.output_images = output_images
+        self.image_index = image_index
+        self.assets = assets
+        # image name -> file to publish instead of the original
+        self.sources: dict[str, str] = {}
+
+    def original(self, image: str) -> str:
+        return os.path.join(self.image_dir, image)
+
+    def source(self, image: str) -> str:
+        return self.sources.get(image, self.original(image))
+
+    def info(self, image: str) -> ImageInfo:
+        return image_info(self.image_index, self.source(image))
+
+    def asset(self, image: str) -> str:
+        """
+        Return the fingerprinted output path for image
+        """
+        name = os.path.join(self.output_images, image)
+        if name not in self.assets:
+            self.assets[name] = os.path.join(self.output_images, fingerprint(image, self.info(image).digest[:8]))
+        return self.assets[name]
@@ -0,0 +1,73 @@
+import hashlib
+import json
+import logging
+import os
+
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from .atomic import atomic_write
+from .exif import image_size
+
+logger = logging.getLogger(__name__)
+
+
+class ImageInfo(BaseModel):
+    """
+    Facts about an image that are expensive to work out, cached until the file changes
+    """
+
+    size: int
+    mtime_ns: int
+    digest: str
+    width: int
+    height: int
+
+
+class ImageIndex(BaseModel):
+    """
+    The build's index of image facts, by the path of the file published. Kept in the cache rather than with
+    each image's metadata: the metadata files are edited by hand and validated with extra fields forbidden,
+    the SQLite catalogue would need to be kept in step, and with --optimize-images the file published (and so
+    its dimensions) is a web copy rather than the image the metadata describes.
+    """
+
+    images: dict[str, ImageInfo] = {}
+
+
+def read_index(index_file: str) -> ImageIndex:
+    try:
+        with open(index_file) as c:
+            return ImageIndex.model_validate(json.load(c))
+    except FileNotFoundError:
+        logger.info("No image index at %s, starting a new one", index_file)
+    except (json.decoder.JSONDecodeError, ValidationError) as e:
+        # it's only a cache, so rebuild it
+        logger.warning("Discarding unreadable image index %s. %s", index_file, e)
+    return ImageIndex()
+
+
+def write_index(index_file: str, index: ImageIndex) -> None:
+    try:
+        os.makedirs(os.path.dirname(index_file), exist_ok=True)
+        atomic_write(index_file, index.model_dump_json().encode(), only_if_changed=True)
+    except OSError as e:
+        logger.error("Unable to write image index: %s. %s", index_file, e)
+
+
+def image_info(index: ImageIndex, image_file: str) -> ImageInfo:
+    """
+    Return the cached info for image_file, reading the image only if it changed since it was indexed
+    """
+    stat = os.stat(image_file)
+    info = index.images.get(image_file)
+    if info is not None and info.size == stat.st_size and info.mtime_ns == stat.st_mtime_ns:
+        return info
+
+    logger.debug("Indexing %s", image_file)
+    with open(image_file, "rb") as f:
+        digest = hashlib.file_digest(f, "sha256").hexdigest()
+    width, height = image_size(image_file)
+    info = ImageInfo(size=stat.st_size, mtime_ns=stat.st_mtime_ns, digest=digest, width=width, height=height)
+    index.images[image_file] = info
+    return info
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Protocol
+
+from pydantic import BaseModel
+from pydantic import ValidationError
+
+from .atomic import atomic_write
+from .config import Site
+from .output import Output
+
+logger = logging.getLogger(__name__)
+
+# published alongside the site, so a deployed copy can be compared with a new build for delta uploads
+INTEGRITY_FILE = "integrity.json"
+CHUNK = 1 << 20
+
+
+class Hasher(Protocol):
+    def update(self, data: bytes | memoryview, /) -> None: ...
+
+    def hexdigest(self) -> str: ...
+
+
+def default_algorithm() -> str:
+    """
+    xxh3 when the optional xxhash module (the xxhash extra) is installed, otherwise BLAKE2 from the standard library
+    """
+    try:
+        import xxhash  # noqa: F401
+
+        return "xxh3_128"
+    except ImportError:
+        return "blake2b"
+
+
+def new_hasher(algorithm: str) -> Hasher:
+    if algorithm == "xxh3_128":
+        import xxhash
+
+        hasher: Hasher = xxhash.xxh3_128()
+        return hasher
+    return hashlib.blake2b(digest_size=16)
+
+
+def hash_file(filename: str, algorithm: str) -> str:
+    """
+    Hash filename through an mmap in CHUNK sized pieces, without copying it into memory
+    """
+    hasher = new_hasher(algorithm)
+    with open(filename, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > 0:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m, memoryview(m) as view:
+                for start in range(0, size, CHUNK):
+                    hasher.update(view[start : start + CHUNK])
+    return hasher.hexdigest()
+
+
+def hash_files(filenames: list[str], algorithm: str) -> list[str]:
+    # hashlib and xxhash release the GIL on large buffers so threads hash in parallel
+    with ThreadPoolExecutor() as executor:
+        return list(executor.map(hash_file, filenames, [algorithm] * len(filenames)))
+
+
+class FileEntry(BaseModel):
+    size: int
+    digest: str
+
+
+class IntegrityManifest(BaseModel):
+    algorithm: str
+    files: dict[str, FileEntry] = {}
+
+
+class CachedHash(BaseModel):
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class HashCache(BaseModel):
+    """
+    Digests of the files behind the output, by real path, reused until their size or mtime changes
+    """
+
+    algorithm: str
+    files: dict[str, CachedHash] = {}
+
+
+def read_hash_cache(cache_file: str) -> HashCache:
+    algorithm = default_algorithm()
+    try:
+        with open(cache_file) as f:
+            cache = HashCache.model_validate(json.load(f))
+            if cache.algorithm == algorithm:
+                return cache
+    except FileNotFoundError:
+        pass
+    except (json.decoder.JSONDecodeError, ValidationError) as e:
+        # it's only a cache, so rebuild it
+        logger.warning("Discarding unreadable hash cache %s. %s", cache_file, e)
+    return HashCache(algorithm=algorithm)
+
+
+def write_hash_cache(cache_file: str, cache: HashCache) -> None:
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        atomic_write(cache_file, cache.model_dump_json().encode(), only_if_changed=True)
+    except OSError as e:
+        logger.error("Unable to write hash cache: %s. %s", cache_file, e)
+
+
+def write_manifest(output: Output, cache: HashCache) -> None:
+    """
+    Write INTEGRITY_FILE listing the size and digest of every file in this build.
+    Only files whose size or mtime changed since the last build are read, so the images behind the
+    symlinks are hashed once rather than on every build.
+    cache may be shared with other sites built at the same time, the caller reads and writes it
+    """
+    algorithm = cache.algorithm
+    names = sorted(name for name in output.files if name != INTEGRITY_FILE)
+
+    reals = {name: os.path.realpath(output.path(name)) for name in names}
+    stats = {real: os.stat(real) for real in reals.values()}
+    todo = []
+    # a reproducible build stamps every file with the same mtime, so changed files are never taken from the cache
+    changed = {os.path.realpath(filename) for filename in output.changed}
+    for real, stat in stats.items():
+        cached = cache.files.get(real)
+        hit = (
+            real not in changed
+            and cached is not None
+            and cached.size == stat.st_size
+            and cached.mtime_ns == stat.st_mtime_ns
+        )
+        output.cached("hashes", hit)
+        if not hit:
+            todo.append(real)
+
+    logger.info("Hashing %s of %s files with %s", len(todo), len(stats), algorithm)
+    for real, digest in zip(todo, hash_files(todo, algorithm), strict=True):
+        cache.files[real] = CachedHash(size=stats[real].st_size, mtime_ns=stats[real].st_mtime_ns, digest=digest)
+
+    manifest = IntegrityManifest(algorithm=algorithm)
+    for name, real in reals.items():
+        manifest.files[name] = FileEntry(size=stats[real].st_size, digest=cache.files[real].digest)
+    output.write(INTEGRITY_FILE, manifest.model_dump_json(indent=2) + "\n")
+
+
+def hash_tree(published: str, algorithm: str) -> dict[str, FileEntry]:
+    names = []
+    filenames = []
+    for dirpath, _, files in os.walk(published, followlinks=True):
+        for file in files:
+            filename = os.path.join(dirpath, file)
+            names.append(os.path.relpath(filename, published).replace(os.sep, "/"))
+            filenames.append(filename)
+    digests = hash_files(filenames, algorithm)
+    return {
+        name: FileEntry(size=os.stat(filename).st_size, digest=digest)
+        for name, filename, digest in zip(names, filenames, digests, strict=True)
+    }
+
+
+def hash_tarball(published: str, algorithm: str) -> dict[str, FileEntry]:
+    # a gzip stream can only be read in order, so this is the one sequential path
+    found = {}
+    with tarfile.open(published, "r:*") as tar:
+        for member in tar:
+            f = tar.extractfile(member)
+            if f is None:
+                continue
+            hasher = new_hasher(algorithm)
+            while chunk := f.read(CHUNK):
+                hasher.update(chunk)
+            found[os.path.normpath(member.name)] = FileEntry(size=member.size, digest=hasher.hexdigest())
+    return found
+
+
+def verify_published(*, site: Site, published: str) -> int:
+    """
+    Compare a deployed tree or tarball with the manifest of the last build
+    """
+    manifest_file = os.path.join(site.output_dir, INTEGRITY_FILE)
+    try:
+        with open(manifest_file) as f:
+            manifest = IntegrityManifest.model_validate(json.load(f))
+    except (OSError, json.decoder.JSONDecodeError, ValidationError) as e:
+        logger.error("Unable to read %s, run generate first. %s", manifest_file, e)
+        return 1
+
+    try:
+        if os.path.isdir(published):
+            found = hash_tree(published, manifest.algorithm)
+        else:
+            found = hash_tarball(published, manifest.algorithm)
+    except (OSError, tarfile.TarError, ImportError) as e:
+        logger.error("Unable to read %s. %s", published, e)
+        return 1
+    found.pop(INTEGRITY_FILE, None)
+
+    errors = 0
+    for name, expected in manifest.files.items():
+        actual = found.get(name)
+        if actual is None:
+            logger.error("%s is missing from %s", name, published)
+            errors += 1
+        elif actual.size != expected.size:
+            logger.error("%s is %s bytes, expected %s", name, actual.size, expected.size)
+            errors += 1
+        elif actual.digest != expected.digest:
+            logger.error("%s does not match its %s digest", name, manifest.algorithm)
+            errors += 1
+    for name in sorted(found.keys() - manifest.files.keys()):
+        logger.error("%s in %s is not part of the build", name, published)
+        errors += 1
+
+    logger.info("Checked %s files in %s, %s problems", len(manifest.files), published, errors)
+    return 1 if errors else 0
@@ -0,0 +1,141 @@
+import contextlib
+import datetime
+import json
+import logging
+import threading
+import time
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+LOG_FORMATS = ("text", "json")
+# how often Progress may log, in seconds
+PROGRESS_INTERVAL = 1.0
+
+# attributes every LogRecord has, anything else came from extra= and is logged as a field of its own
+RECORD_ATTRIBUTES = frozenset(logging.makeLogRecord({}).__dict__) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for CI to parse. The message is formatted here from the record's args,
+    so records that no handler emits are never formatted.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def formatter(log_format: str) -> logging.Formatter:
+    if log_format == "json":
+        return JsonFormatter()
+    return logging.Formatter(LOG_FORMAT)
+
+
+def log_level(verbose: int) -> int:
+    """
+    --verbose logs progress, twice logs every file
+    """
+    if verbose > 1:
+        return logging.DEBUG
+    if verbose:
+        return logging.INFO
+    return logging.ERROR
+
+
+def setup_logging(*, verbose: int, log_format: str) -> None:
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter(log_format))
+    logging.basicConfig(level=log_level(verbose), handlers=[handler])
+
+
+class Progress:
+    """
+    Logs how far through a loop of total items it is at most every interval seconds, instead of a line per item
+    """
+
+    def __init__(self, logger: logging.Logger, what: str, total: int, *, interval: float = PROGRESS_INTERVAL) -> None:
+        self.logger = logger
+        self.what = what
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start = self.last = time.perf_counter()
+
+    def advance(self, count: int = 1) -> None:
+        self.done += count
+        now = time.perf_counter()
+        if now - self.last < self.interval and self.done < self.total:
+            return
+        self.last = now
+        elapsed = now - self.start
+        self.logger.info(
+            "%s %d/%d (%.0f/s)",
+            self.what,
+            self.done,
+            self.total,
+            self.done / elapsed if elapsed > 0 else 0,
+            extra={"progress": self.what, "done": self.done, "total": self.total},
+        )
+
+
+class ErrorCounter(logging.Handler):
+    """
+    Counts the errors logged on the thread that created it, so sites built concurrently count their own
+    """
+
+    def __init__(self) -> None:
+        super().__init__(logging.ERROR)
+        self.thread = threading.get_ident()
+        self.count = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.thread == self.thread:
+            self.count += 1
+
+
+@contextlib.contextmanager
+def count_errors() -> Iterator[ErrorCounter]:
+    counter = ErrorCounter()
+    root = logging.getLogger()
+    root.addHandler(counter)
+    try:
+        yield counter
+    finally:
+        root.removeHandler(counter)
+
+
+class Forward(logging.Handler):
+    """
+    Hands records logged in a worker process to this process' loggers, so they're filtered, formatted
+    and counted like records logged here, see log_to_queue
+    """
+
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def log_to_queue(records: "Queue[logging.LogRecord]", level: int) -> None:
+    """
+    Worker process initializer: send every record at level or above to the parent listening on records
+    """
+    # not needed on the startup path
+    import logging.handlers
+
+    root = logging.getLogger()
+    root.handlers = [logging.handlers.QueueHandler(records)]
+    root.setLevel(level)
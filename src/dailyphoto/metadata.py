@@ -1,25 +1,36 @@
+import itertools
 import json
 import logging
 import os
 import subprocess
 import sys
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
 from pydantic import ValidationError
 
 from . import kitty
-from .config import Config
-from .exif import exif_to_metadata
+from .atomic import atomic_write
+from .config import CACHE_DIR
+from .config import Site
+from .types import Config
 from .types import Metadata
 from .types import MetadataEditable
 
-logger = logging.getLogger(__name__)
+if TYPE_CHECKING:
+    # catalogue imports this module for the json helpers
+    from .catalogue import Catalogue
 
+logger = logging.getLogger(__name__)
 
-def get_metadata_filename(metadata_dir: str, image: str) -> str:
-    return os.path.join(
-        metadata_dir,
-        os.path.splitext(os.path.basename(image))[0] + ".json",
-    )
+# how many entries the interactive loop prepares ahead of the one being edited
+PREFETCH = 3
+PREFETCH_WORKERS = 2
+PREVIEW_DIR = os.path.join(CACHE_DIR, "previews")
+# long edge of the previews shown with icat, about a screen
+PREVIEW_EDGE = 1600
+PREVIEW_QUALITY = 85
 
 
 def read_metadata(metadata_file: str) -> Metadata | None:
@@ -28,18 +39,16 @@ def read_metadata(metadata_file: str) -> Metadata | None:
             parsed = json.load(c)
             return Metadata.model_validate(parsed)
     except (FileNotFoundError, json.decoder.JSONDecodeError, ValidationError) as e:
-        logger.error(f"Unable to load metadata: {metadata_file}. {e}")
+        logger.error("Unable to load metadata: %s. %s", metadata_file, e)
         return None
 
 
 def write_metadata(metadata_file: str, metadata: Metadata | MetadataEditable) -> None:
     try:
-        with open(metadata_file, "w") as c:
-            c.write(metadata.model_dump_json(indent=2))
-            # include a final line ending
-            c.write("\n")
+        # include a final line ending
+        atomic_write(metadata_file, (metadata.model_dump_json(indent=2) + "\n").encode(), only_if_changed=True)
     except OSError as e:
-        logger.error(f"Unable to write metadata: {metadata_file}. {e}")
+        logger.error("Unable to write metadata: %s. %s", metadata_file, e)
 
 
 def edit_json(json_name: str, image_name: str, window_id: str) -> int:
@@ -53,63 +62,127 @@ def edit_json(json_name: str, image_name: str, window_id: str) -> int:
     return subprocess.call(["nvim", json_name])
 
 
-def update(
-    image_name: str,
-    json_name: str,
-    always_edit: bool,
-    window_id: str,
-) -> int:
-    # First attempt to validate the existing on disk metadata file to see if it needs edited.
-    edit = always_edit
+class Entry:
+    """
+    One image and its metadata file, loaded and checked ahead of the interactive update
+    """
+
+    def __init__(self, image_name: str, json_name: str) -> None:
+        self.image_name = image_name
+        self.json_name = json_name
+        self.exists = True
+        self.parse_error: str | None = None
+        self.validation_errors: list[str] = []
+        self.metadata = MetadataEditable()
+        # what icat shows, a screen sized copy when one could be made
+        self.preview = image_name
+
+
+def preview(image_name: str) -> str:
+    """
+    Screen sized copy of image_name for icat, much quicker to decode and send than the full size scan.
+    Named after the image size and mtime so an edited image gets a new preview.
+    """
+    # Pillow is only needed here, not by the catalogue reading and writing metadata files
+    from .optimize import optimize_image
+
+    stat = os.stat(image_name)
+    prefix = os.path.splitext(os.path.basename(image_name))[0]
+    # absolute as the kitty window runs in another directory
+    dest = os.path.abspath(os.path.join(PREVIEW_DIR, f"{prefix}-{stat.st_size}-{stat.st_mtime_ns}.jpg"))
+    if not os.path.exists(dest):
+        os.makedirs(PREVIEW_DIR, exist_ok=True)
+        optimize_image(image_name, dest, PREVIEW_QUALITY, PREVIEW_EDGE)
+    return dest
+
+
+def prepare(image_name: str, json_name: str) -> Entry:
+    """
+    The slow part of update: read and validate the json, merge in the EXIF and render the preview.
+    Runs in a background thread so it's done by the time the user gets to this image.
+    """
+    from .exif import exif_to_metadata
+
+    entry = Entry(image_name, json_name)
+    try:
+        entry.preview = preview(image_name)
+    except OSError as e:
+        logger.warning("Unable to make a preview of %s, showing the original. %s", image_name, e)
+
     json_dict = None
     try:
         with open(json_name) as c:
             json_dict = json.load(c)
     except FileNotFoundError:
-        logger.info(f"Creating new metadata {json_name}.")
-        edit = True
+        entry.exists = False
     except json.decoder.JSONDecodeError as e:
-        # if the json is garbage just to edit it
-        logger.error(f"Unable to parse metadata file: {json_name}. {e}")
-        return edit_json(json_name, image_name, window_id)
+        entry.parse_error = str(e)
+        return entry
 
-    metadata = MetadataEditable()
     if json_dict is not None:
         try:
             Metadata.model_validate(json_dict)
         except ValidationError as valid_e:
-            # If it fails to validate, we need to edit.
-            logger.error(f"Metadata file {json_name} failed to validate:")
-            for x in valid_e.errors():
-                logger.error(f"\tField {x['loc'][0]}: {x['msg']}")
-            edit = True
+            entry.validation_errors = [f"Field {x['loc'][0]}: {x['msg']}" for x in valid_e.errors()]
 
         # Load existing data
-        metadata = metadata.model_validate(json_dict)
+        entry.metadata = entry.metadata.model_validate(json_dict)
 
     # Update metadata with data from the image
-    exif_to_metadata(image_name, metadata)
-    write_metadata(json_name, metadata)
+    exif_to_metadata(image_name, entry.metadata)
+    return entry
+
+
+def update(
+    entry: Entry,
+    always_edit: bool,
+    window_id: str,
+) -> int:
+    # First check whether the existing on disk metadata file needs edited.
+    edit = always_edit
+    json_name = entry.json_name
+    if entry.parse_error is not None:
+        # if the json is garbage just to edit it
+        logger.error("Unable to parse metadata file: %s. %s", json_name, entry.parse_error)
+        return edit_json(json_name, entry.preview, window_id)
+
+    if not entry.exists:
+        logger.info("Creating new metadata %s.", json_name)
+        edit = True
+    if entry.validation_errors:
+        # If it fails to validate, we need to edit.
+        logger.error("Metadata file %s failed to validate:", json_name)
+        for error in entry.validation_errors:
+            logger.error("\t%s", error)
+        edit = True
+
+    write_metadata(json_name, entry.metadata)
 
     if edit or always_edit:
         json.dump(
-            metadata.model_dump(),
+            entry.metadata.model_dump(),
             sys.stdout,
             sort_keys=True,
             indent=2,
         )
-        logger.info(f"editing {os.path.basename(image_name)}")
-        return edit_json(json_name, image_name, window_id)
+        logger.info("editing %s", os.path.basename(entry.image_name))
+        return edit_json(json_name, entry.preview, window_id)
     else:
         return 0
 
 
 def metadata(
     *,
+    site: Site,
     conf: Config,
+    catalogue: "Catalogue",
     always_edit: bool,
     source_dir: str,
 ) -> int:
+    """
+    Check and edit the metadata json files in source_dir, then hand them to the catalogue
+    so a catalogue that isn't the json files themselves (SQLite) stores the edits
+    """
     id = kitty.new_window()
     kitty.set_layout("horizontal")
 
@@ -118,18 +191,27 @@ def metadata(
     metadata_dir = os.path.join(output_dir, "metadata")
     rets = 0
 
-    for date in conf.dates:
-        prefix, ext = os.path.splitext(date.filename)
-        if ext == ".jpg":
-            ret = update(
-                os.path.join(image_dir, date.filename),
-                os.path.join(metadata_dir, prefix + os.path.extsep + "json"),
-                always_edit,
-                id,
-            )
+    entries = iter(
+        (
+            os.path.join(image_dir, date.filename),
+            os.path.join(metadata_dir, os.path.splitext(date.filename)[0] + os.path.extsep + "json"),
+        )
+        for date in conf.dates
+        if os.path.splitext(date.filename)[1] == ".jpg"
+    )
+    # prepare the next few entries while the user edits the current one
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+        prepared = deque(executor.submit(prepare, *entry) for entry in itertools.islice(entries, PREFETCH))
+        while prepared:
+            entry = prepared.popleft().result()
+            prepared.extend(executor.submit(prepare, *entry) for entry in itertools.islice(entries, 1))
+            ret = update(entry, always_edit, id)
             # -1 is the signal to quit since processes return positive numbers
             if ret < 0:
+                executor.shutdown(cancel_futures=True)
                 break
             rets += ret
     kitty.close_window(id)
-    return rets
+
+    state = "queued" if os.path.realpath(metadata_dir) == os.path.realpath(site.unused_metadata) else "current"
+    return rets + catalogue.sync_metadata(metadata_dir, state)
@@ -0,0 +1,120 @@
+import json
+import logging
+import os
+
+from pydantic import BaseModel
+from pydantic import computed_field
+
+from .atomic import atomic_write
+from .output import Output
+
+logger = logging.getLogger(__name__)
+
+# node_exporter's textfile collector reads files with this extension, anything else is written as JSON
+PROMETHEUS_EXT = ".prom"
+
+
+class BuildMetrics(BaseModel):
+    site: str
+    seconds: float
+    # html pages rendered, whether or not their content changed
+    pages: int
+    files: int
+    files_written: int
+    bytes_written: int
+    cache_hits: dict[str, int]
+    cache_misses: dict[str, int]
+    errors: int
+
+    @classmethod
+    def of(cls, output: Output, *, seconds: float, errors: int) -> "BuildMetrics":
+        return cls(
+            site=output.output_dir,
+            seconds=seconds,
+            pages=output.pages_rendered,
+            files=len(output.files),
+            files_written=output.files_written,
+            bytes_written=output.bytes_changed,
+            cache_hits=dict(output.cache_hits),
+            cache_misses=dict(output.cache_misses),
+            errors=errors,
+        )
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds > 0 else 0.0
+
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def cache_hit_rate(self) -> float:
+        hits = sum(self.cache_hits.values())
+        lookups = hits + sum(self.cache_misses.values())
+        return hits / lookups if lookups else 0.0
+
+    def log(self) -> None:
+        logger.info(
+            "Built %s in %.3fs: %s pages (%.0f/s), wrote %s of %s files (%s bytes), cache hit rate %.1f%%, %s errors",
+            self.site,
+            self.seconds,
+            self.pages,
+            self.pages_per_second,
+            self.files_written,
+            self.files,
+            self.bytes_written,
+            100 * self.cache_hit_rate,
+            self.errors,
+        )
+
+
+# name, help, value of each metric
+GAUGES = (
+    ("build_seconds", "Time taken to build the site", lambda m: m.seconds),
+    ("pages", "HTML pages rendered", lambda m: m.pages),
+    ("pages_per_second", "HTML pages rendered per second", lambda m: m.pages_per_second),
+    ("files", "Files in the build", lambda m: m.files),
+    ("files_written", "Files whose content changed", lambda m: m.files_written),
+    ("bytes_written", "Bytes of the files whose content changed", lambda m: m.bytes_written),
+    ("cache_hit_rate", "Share of cache lookups that hit", lambda m: m.cache_hit_rate),
+    ("errors", "Errors logged during the build", lambda m: m.errors),
+)
+
+
+def label(value: str) -> str:
+    """
+    Escape a label value for the text exposition format, site paths may contain any of these
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus(metrics: list[BuildMetrics]) -> str:
+    lines = []
+    for name, description, value in GAUGES:
+        lines.append(f"# HELP dailyphoto_{name} {description}")
+        lines.append(f"# TYPE dailyphoto_{name} gauge")
+        lines.extend(f'dailyphoto_{name}{{site="{label(m.site)}"}} {value(m)}' for m in metrics)
+    for name, description, attribute in (
+        ("cache_hits", "Cache lookups that hit, by cache", "cache_hits"),
+        ("cache_misses", "Cache lookups that missed, by cache", "cache_misses"),
+    ):
+        lines.append(f"# HELP dailyphoto_{name} {description}")
+        lines.append(f"# TYPE dailyphoto_{name} gauge")
+        for m in metrics:
+            for cache, count in sorted(getattr(m, attribute).items()):
+                lines.append(f'dailyphoto_{name}{{site="{label(m.site)}",cache="{label(cache)}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(metrics_file: str, metrics: list[BuildMetrics]) -> None:
+    """
+    Write the metrics of each site built as JSON, or in Prometheus' textfile format for a .prom file.
+    Written atomically, the textfile collector may read it at any time.
+    """
+    if os.path.splitext(metrics_file)[1] == PROMETHEUS_EXT:
+        content = prometheus(metrics)
+    else:
+        content = json.dumps([m.model_dump() for m in metrics], indent=2) + "\n"
+    try:
+        atomic_write(metrics_file, content.encode())
+    except OSError as e:
+        logger.error("Unable to write metrics: %s. %s", metrics_file, e)
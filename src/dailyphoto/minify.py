@@ -0,0 +1,113 @@
+import os
+import re
+
+# Elements whose contents must not have their whitespace touched
+_HTML_PRESERVE = re.compile(r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)", re.S | re.I)
+# Keep conditional comments, they are markup for old browsers
+_HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+# Whitespace next to block level tags never renders, so it can be dropped entirely.
+# Whitespace next to inline tags is significant and is only collapsed to a single space.
+_HTML_BLOCK_TAG = re.compile(
+    r"\s*(</?(?:html|head|body|meta|link|title|script|style|header|main|footer|nav|section|article|aside|"
+    r"div|p|h[1-6]|ul|ol|li|table|thead|tbody|tr|td|th|form|br|hr)\b[^>]*>)\s*",
+    re.I,
+)
+_WHITESPACE = re.compile(r"\s+")
+
+_CSS_STRING_OR_COMMENT = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/""", re.S)
+_CSS_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+_CSS_COLON = re.compile(r":\s+")
+
+# Comments and quoted strings are matched together so quotes inside either one don't start the other
+_JS_STRING_OR_COMMENT = re.compile(r"""//[^\n]*|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`""")
+_JS_PLACEHOLDER = re.compile(r"\0(\d+)\0")
+
+
+def minify_css(css: str) -> str:
+    """
+    Conservative CSS minifier: drops comments and whitespace around punctuation, leaves strings alone
+    """
+    css = _CSS_STRING_OR_COMMENT.sub(lambda m: m.group(1) or "", css)
+    parts = _CSS_STRING.split(css)
+    # split() with a capturing group puts the strings at the odd indexes
+    for i in range(0, len(parts), 2):
+        part = _WHITESPACE.sub(" ", parts[i])
+        part = _CSS_PUNCTUATION.sub(r"\1", part)
+        part = _CSS_COLON.sub(":", part)
+        parts[i] = part.replace(";}", "}")
+    return "".join(parts).strip()
+
+
+def minify_js(js: str) -> str:
+    """
+    Conservative JS minifier: strips indentation, blank lines and whole line // comments.
+    Newlines are kept so automatic semicolon insertion still behaves.
+    """
+    # Template literals spanning lines are swapped for placeholders so their contents are left alone
+    templates: list[str] = []
+
+    def hold(match: re.Match[str]) -> str:
+        literal = match.group()
+        if not literal.startswith("`") or "\n" not in literal:
+            return literal
+        templates.append(literal)
+        return f"\0{len(templates) - 1}\0"
+
+    js = _JS_STRING_OR_COMMENT.sub(hold, js)
+    lines = (line.strip() for line in js.splitlines())
+    js = "\n".join(line for line in lines if line and not line.startswith("//"))
+    return _JS_PLACEHOLDER.sub(lambda m: templates[int(m.group(1))], js)
+
+
+def _minify_preserved(match: re.Match[str]) -> str:
+    start, tag, body, end = match.groups()
+    if tag.lower() == "style":
+        body = minify_css(body)
+    elif tag.lower() == "script":
+        body = minify_js(body)
+    return f"{start}{body}{end}"
+
+
+def _minify_markup(html: str) -> str:
+    html = _HTML_COMMENT.sub("", html)
+    html = _WHITESPACE.sub(" ", html)
+    return _HTML_BLOCK_TAG.sub(r"\1", html)
+
+
+def minify_html(html: str) -> str:
+    """
+    Collapse whitespace and remove comments from html, minifying any inline style and script
+    """
+    out = []
+    last = 0
+    out_block = False
+    for match in _HTML_PRESERVE.finditer(html):
+        # preserved elements other than textarea are block like, so whitespace around them can go
+        block = match.group(2).lower() != "textarea"
+        markup = _minify_markup(html[last : match.start()])
+        if out_block:
+            markup = markup.lstrip()
+        out.append(markup.rstrip() if block else markup)
+        out.append(_minify_preserved(match))
+        out_block = block
+        last = match.end()
+    markup = _minify_markup(html[last:])
+    if out_block:
+        markup = markup.lstrip()
+    out.append(markup)
+    return "".join(out).strip() + "\n"
+
+
+def minify(name: str, content: str) -> str:
+    """
+    Minify content based on the extension of name. Unknown types are returned unchanged.
+    """
+    _, ext = os.path.splitext(name)
+    if ext == ".html":
+        return minify_html(content)
+    if ext == ".css":
+        return minify_css(content)
+    if ext == ".js":
+        return minify_js(content)
+    return content
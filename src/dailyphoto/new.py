@@ -1,12 +1,15 @@
 import logging
 import os
-import random
 import shutil
+import time
 from datetime import datetime
 from datetime import timedelta
 
-from . import config
-from .metadata import get_metadata_filename
+from .catalogue import Catalogue
+from .config import Site
+from .schedule import DEFAULT_SPACING
+from .schedule import Scheduler
+from .schedule import candidate
 from .types import Date
 
 logger = logging.getLogger(__name__)
@@ -16,7 +19,10 @@ def new(
     *,
     images: list[str] | None,
     dates: list[str] | None,
-    config_file: str,
+    site: Site,
+    catalogue: Catalogue,
+    spacing: int = DEFAULT_SPACING,
+    dry_run: bool = False,
 ) -> int:
     # Possible conditions:
     # dates is none, images is none
@@ -27,9 +33,10 @@ def new(
     # add those images for dates specified, bail if they aren't equal
     # dates is None, images is not none
     # choose from these images, from last date til today
+    # The rest are planned by Scheduler, see schedule.py
 
     # load the last day set in the conf file
-    conf = config.read_config(config_file)
+    conf = catalogue.read_config()
     if conf is None:
         return 1
     all_dates = conf.dates
@@ -40,7 +47,7 @@ def new(
     last_day = all_dates[-1].day
 
     # get a list of all potential unused images
-    unused_images = [photo for photo in os.listdir(config.UNUSED_IMAGES)]
+    unused_images = catalogue.queued_images()
 
     # This logic seems complicated BUT
     max_days = min(
@@ -59,11 +66,23 @@ def new(
 
     if images is None:
         images = []
+    chosen = set(images)
+    candidates = {
+        image: candidate(image, catalogue.read_queued_metadata(image)) for image in unused_images if image not in chosen
+    }
+
+    # the recently published days count towards the spacing, then the hand picked images
+    scheduler = Scheduler(list(candidates.values()), spacing=spacing)
+    for published in all_dates[-spacing:] if spacing > 0 else []:
+        scheduler.record(candidate(published.filename, catalogue.read_metadata(published.filename)))
     for image in images:
-        if image in unused_images:
-            unused_images.remove(image)
+        candidates[image] = candidate(image, catalogue.read_queued_metadata(image))
+        scheduler.record(candidates[image])
     if max_days - len(images) > 0:
-        images += random.sample(unused_images, max_days - len(images))
+        start = time.perf_counter()
+        images += [c.image for c in scheduler.plan(max_days - len(images))]
+        seconds = time.perf_counter() - start
+        logger.info("Planned %s days from %s queued images in %.3fs", max_days, len(unused_images), seconds)
 
     if dates is None:
         dates = []
@@ -72,12 +91,19 @@ def new(
 
     dates += [(last_day + timedelta(days=(i + 1))).strftime("%Y%m%d") for i in range(0, max_days - len(dates))]
 
+    if dry_run:
+        for date, image in zip(dates, images, strict=True):
+            c = candidates[image]
+            print(f"{date} {image} film={c.film or '?'} camera={c.camera or '?'} year={c.year or '?'}")
+        return 0
+
     ret = 0
     for date, image in zip(dates, images, strict=True):
         ret += new_image(
             new_date=date,
             new_image=image,
-            config_file=config_file,
+            site=site,
+            catalogue=catalogue,
         )
     return ret
 
@@ -86,12 +112,13 @@ def new_image(
     *,
     new_date: str,
     new_image: str,
-    config_file: str,
+    site: Site,
+    catalogue: Catalogue,
 ) -> int:
     """
-    Choose and move a new image to IMAGES
+    Choose and move a new image to the site's images
     """
-    conf = config.read_config(config_file)
+    conf = catalogue.read_config()
     if conf is None:
         return 1
 
@@ -100,38 +127,24 @@ def new_image(
     # Detect if a date or image has been used before
     for date in conf.dates:
         if date.day == date_to_add.day:
-            logger.error(f"already have an image for {date_to_add.day}")
+            logger.error("already have an image for %s", date_to_add.day)
             return 1
         if date.filename == date_to_add.filename:
-            logger.error(f"{date_to_add.filename} was already used on {new_date}")
+            logger.error("%s was already used on %s", date_to_add.filename, new_date)
             return 1
 
-    old_image_path = os.path.join(config.UNUSED_IMAGES, date_to_add.filename)
+    old_image_path = os.path.join(site.unused_images, date_to_add.filename)
     if not os.path.exists(old_image_path):
-        logger.error(f"{old_image_path} does not exist")
+        logger.error("%s does not exist", old_image_path)
         return 1
-    new_image_path = os.path.join(config.IMAGES, date_to_add.filename)
-    logger.info(f"Moving {old_image_path} to {new_image_path}")
+    new_image_path = os.path.join(site.images, date_to_add.filename)
+    logger.info("Moving %s to %s", old_image_path, new_image_path)
     shutil.move(old_image_path, new_image_path)
 
-    # Try to move the metadata file
-    old_metadata_file = get_metadata_filename(
-        config.UNUSED_METADATA,
-        date_to_add.filename,
-    )
-    if os.path.exists(old_metadata_file):
-        new_metadata_file = get_metadata_filename(
-            config.METADATA_DIR,
-            date_to_add.filename,
-        )
-        logger.info(f"Moving {old_metadata_file} to {new_metadata_file}")
-        shutil.move(old_metadata_file, new_metadata_file)
-    else:
-        logger.warning(f"{old_metadata_file} does not exist, no need to move")
+    # Try to move the metadata
+    catalogue.publish(date_to_add.filename)
 
-    conf.dates.append(date_to_add)
-    logger.info(f"Writing {config_file}")
-    config.write_config(config_file, conf)
+    catalogue.add_date(date_to_add)
 
-    logger.info(f"Added {new_date}: {date_to_add.filename}")
+    logger.info("Added %s: %s", new_date, date_to_add.filename)
     return 0
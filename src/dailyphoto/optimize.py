@@ -0,0 +1,187 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+from PIL import Image
+from PIL import ImageOps
+from PIL.ExifTags import Base
+
+from .atomic import atomic_open
+
+logger = logging.getLogger(__name__)
+
+# Used instead of "keep" or "lossless" when the image had to be rotated or resized, so has to be re-encoded
+FALLBACK_QUALITY = 95
+# JPEG markers
+SOI = b"\xff\xd8"
+SOS = 0xDA
+APP0 = 0xE0
+APP2 = 0xE2
+APP14 = 0xEE
+JFIF = b"JFIF\0"
+ICC_PROFILE = b"ICC_PROFILE\0"
+
+
+def optimized_filename(cache_dir: str, digest: str, quality: int | str, max_edge: int | None) -> str:
+    """
+    Name the web copy after the source digest and the settings so changing either makes a new copy
+    """
+    return os.path.join(cache_dir, f"{digest[:16]}-q{quality}-e{max_edge or 0}.jpg")
+
+
+def keep_segment(marker: int, payload: bytes) -> bool:
+    """
+    Whether a segment before the image data is needed to display it: anything but an application segment
+    or comment, plus JFIF, the ICC colour profile and Adobe's colour transform
+    """
+    if marker == APP0:
+        # not a JFXX thumbnail
+        return payload.startswith(JFIF)
+    if marker == APP2:
+        return payload.startswith(ICC_PROFILE)
+    if APP0 < marker <= 0xEF or marker == 0xFE:
+        return marker == APP14
+    return True
+
+
+def strip_jpeg(data: bytes) -> bytes | None:
+    """
+    Drop the EXIF, XMP, comments and other metadata segments from a JPEG without decoding it,
+    the compressed image is copied as is. None if data isn't a JPEG this understands.
+    """
+    if not data.startswith(SOI):
+        return None
+    parts = [SOI]
+    pos = len(SOI)
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:
+            # fill byte before a marker
+            pos += 1
+            continue
+        if marker == SOS:
+            # the scans and everything after them
+            parts.append(data[pos:])
+            return b"".join(parts)
+        end = pos + 2 + int.from_bytes(data[pos + 2 : pos + 4], "big")
+        if keep_segment(marker, data[pos + 4 : end]):
+            parts.append(data[pos:end])
+        pos = end
+    return None
+
+
+def optimize_image(source: str, dest: str, quality: int | str, max_edge: int | None) -> None:
+    """
+    Write a progressive JPEG web copy of source to dest.
+    EXIF and other metadata are dropped, but the colour profile is kept.
+    lossless copies the compressed image unchanged, so it stays as progressive as the source was.
+    """
+    with Image.open(source) as original:
+        if quality == "lossless":
+            rotated = original.getexif().get(Base["Orientation"], 1) != 1
+            resized = max_edge is not None and max(original.size) > max_edge
+            if original.format == "JPEG" and not rotated and not resized:
+                with open(source, "rb") as f:
+                    data = strip_jpeg(f.read())
+                if data is not None:
+                    with atomic_open(dest) as f:
+                        f.write(data)
+                    return
+            logger.debug("Re-encoding %s, it can't be copied losslessly", source)
+            quality = FALLBACK_QUALITY
+
+        icc_profile = original.info.get("icc_profile")
+        image: Image.Image = original
+        # keep only works on the JPEG as it was loaded
+        changed = False
+        # Orientation lives in the EXIF we're about to strip, so apply it to the pixels
+        if image.getexif().get(Base["Orientation"], 1) != 1:
+            image = ImageOps.exif_transpose(image)
+            changed = True
+        if max_edge is not None and max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+            changed = True
+        if quality == "keep" and changed:
+            quality = FALLBACK_QUALITY
+
+        options: dict[str, Any] = {
+            "format": "JPEG",
+            "quality": quality,
+            "optimize": True,
+            "progressive": True,
+        }
+        if quality == "keep":
+            options["subsampling"] = "keep"
+        if icc_profile:
+            options["icc_profile"] = icc_profile
+
+        # an interrupted run never leaves a partial copy in the cache
+        with atomic_open(dest) as f:
+            image.save(f, **options)
+
+
+def optimize_images(
+    sources: dict[str, str],
+    digests: dict[str, str],
+    cache_dir: str,
+    quality: int | str,
+    max_edge: int | None,
+) -> dict[str, str]:
+    """
+    Make web copies of sources (image name -> path) in a process pool, reusing copies already in cache_dir.
+    Returns image name -> web copy path.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    optimized = {
+        image: optimized_filename(cache_dir, digests[image], quality, max_edge) for image, source in sources.items()
+    }
+    todo = {image: dest for image, dest in optimized.items() if not os.path.exists(dest)}
+    logger.info("Optimizing %s images, %s already cached", len(todo), len(optimized) - len(todo))
+
+    if todo:
+        # the daemon calls this with other threads alive, forking then could copy a lock another thread holds
+        with ProcessPoolExecutor(mp_context=multiprocessing.get_context("forkserver")) as pool:
+            futures = [
+                pool.submit(optimize_image, sources[image], dest, quality, max_edge) for image, dest in todo.items()
+            ]
+            for future in futures:
+                # re-raise any failure from the workers
+                future.result()
+
+    before = sum(os.path.getsize(source) for source in sources.values())
+    after = sum(os.path.getsize(dest) for dest in optimized.values())
+    if before > 0:
+        saved = before - after
+        logger.info(
+            "Optimized images from %s to %s bytes (saved %s, %.1f%%)", before, after, saved, 100 * saved / before
+        )
+    return optimized
+
+
+def prune_optimized(optimized_dir: str, output_dirs: list[str]) -> None:
+    """
+    Remove the web copies in optimized_dir that no output links to, ie of images since replaced or
+    built with other settings. Call once every site sharing optimized_dir has been built.
+    """
+    if not os.path.isdir(optimized_dir):
+        return
+    linked = set()
+    for output_dir in output_dirs:
+        for root, _, files in os.walk(output_dir):
+            for name in files:
+                filename = os.path.join(root, name)
+                if os.path.islink(filename):
+                    linked.add(os.path.realpath(filename))
+    removed = 0
+    for name in os.listdir(optimized_dir):
+        filename = os.path.join(optimized_dir, name)
+        if os.path.realpath(filename) not in linked:
+            logger.debug("Removing stale %s", filename)
+            os.remove(filename)
+            removed += 1
+    if removed:
+        logger.info("Removed %d stale web copies from %s", removed, optimized_dir)
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+
+from .assets import content_hash
+from .assets import fingerprint
+from .atomic import DirectorySync
+from .atomic import atomic_symlink
+from .atomic import atomic_write
+from .minify import minify as minify_content
+
+logger = logging.getLogger(__name__)
+
+
+def read_page_state(state_file: str) -> dict[str, str]:
+    """
+    Page name -> signature of the inputs it was last rendered from, see FacetIndex.write
+    """
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+            if isinstance(state, dict):
+                return state
+    except FileNotFoundError:
+        pass
+    except json.decoder.JSONDecodeError as e:
+        # it's only a cache, rebuilding every page is always safe
+        logger.warning("Discarding unreadable page state %s. %s", state_file, e)
+    return {}
+
+
+def write_page_state(state_file: str, state: dict[str, str]) -> None:
+    try:
+        os.makedirs(os.path.dirname(state_file), exist_ok=True)
+        atomic_write(state_file, json.dumps(state, sort_keys=True).encode(), only_if_changed=True)
+    except OSError as e:
+        logger.error("Unable to write page state: %s. %s", state_file, e)
+
+
+class Output:
+    """
+    Writes rendered files into the output directory, optionally minifying them on the way.
+    Keeps track of how much minifying cost and saved so it can be weighed up at the end of a build,
+    and of every file belonging to this build so anything left over from earlier builds can be swept.
+    Files are replaced atomically and only when their content changed, so unchanged pages keep their mtimes.
+    """
+
+    def __init__(self, output_dir: str, *, minify: bool = False, mtime: int | None = None) -> None:
+        self.output_dir = output_dir
+        self.minify = minify
+        # for reproducible builds, the mtime of every file of the build whether or not it changed,
+        # unless it's written with its own
+        self.mtime = mtime
+        self.minify_seconds = 0.0
+        self.bytes_rendered = 0
+        self.bytes_written = 0
+        self.files_unchanged = 0
+        self.files_written = 0
+        self.bytes_changed = 0
+        self.pages_rendered = 0
+        # cache name -> lookups, see cached()
+        self.cache_hits: Counter[str] = Counter()
+        self.cache_misses: Counter[str] = Counter()
+        self._dirs: set[str] = set()
+        # directories to fsync once the build is written, see sync()
+        self._sync = DirectorySync()
+        # names relative to output_dir of every file that's part of this build
+        self.files: set[str] = set()
+        # paths of the files whose content changed in this build
+        self.changed: set[str] = set()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.output_dir, name)
+
+    def _prepare(self, name: str, content: str | bytes) -> bytes:
+        if isinstance(content, bytes):
+            # binary files are written as is
+            self.bytes_rendered += len(content)
+            self.bytes_written += len(content)
+            return content
+        self.bytes_rendered += len(content.encode())
+        if self.minify:
+            start = time.perf_counter()
+            content = minify_content(name, content)
+            self.minify_seconds += time.perf_counter() - start
+        data = content.encode()
+        self.bytes_written += len(data)
+        return data
+
+    def _makedirs(self, filename: str) -> None:
+        dirname = os.path.dirname(filename)
+        if dirname not in self._dirs:
+            os.makedirs(dirname, exist_ok=True)
+            self._dirs.add(dirname)
+
+    def _atomic_write(self, filename: str, data: bytes, mtime: int | None = None) -> None:
+        if atomic_write(filename, data, only_if_changed=True, dirs=self._sync):
+            self.files_written += 1
+            self.bytes_changed += len(data)
+            self.changed.add(filename)
+        else:
+            self.files_unchanged += 1
+        self._stamp(filename, mtime)
+
+    def _stamp(self, filename: str, mtime: int | None = None) -> None:
+        if mtime is None:
+            mtime = self.mtime
+        if mtime is not None:
+            os.utime(filename, (mtime, mtime), follow_symlinks=False)
+
+    def cached(self, cache: str, hit: bool) -> None:
+        """
+        Count a lookup in one of the build's caches, for BuildMetrics
+        """
+        if hit:
+            self.cache_hits[cache] += 1
+        else:
+            self.cache_misses[cache] += 1
+
+    def keep(self, name: str) -> None:
+        """
+        Mark a file not written through Output (ie a page that didn't change) as part of this build
+        """
+        self.files.add(name)
+        self._stamp(self.path(name))
+
+    def write(self, name: str, content: str, *, mtime: int | None = None) -> None:
+        """
+        mtime is for reproducible builds, when the inputs of this file last changed
+        """
+        filename = self.path(name)
+        logger.debug("Writing %s", filename)
+        self._makedirs(filename)
+        self.files.add(name)
+        if name.endswith(".html"):
+            self.pages_rendered += 1
+        self._atomic_write(filename, self._prepare(name, content), mtime)
+
+    def symlink(self, name: str, target: str) -> None:
+        """
+        Publish target as name via a relative symlink, replacing a broken or stale link atomically
+        """
+        filename = self.path(name)
+        link = os.path.relpath(target, os.path.dirname(filename))
+        self.files.add(name)
+        if os.path.islink(filename) and os.readlink(filename) == link:
+            self._stamp(filename)
+            return
+        logger.debug("Linking %s", filename)
+        self._makedirs(filename)
+        atomic_symlink(link, filename, dirs=self._sync)
+        self._stamp(filename)
+
+    def write_asset(self, name: str, content: str | bytes) -> str:
+        """
+        Write content under a fingerprinted version of name and return that name
+        """
+        data = self._prepare(name, content)
+        asset = fingerprint(name, content_hash(data))
+        filename = self.path(asset)
+        logger.debug("Creating %s", filename)
+        self._makedirs(filename)
+        self.files.add(asset)
+        self._atomic_write(filename, data)
+        return asset
+
+    def sweep(self) -> None:
+        """
+        Remove files from earlier builds that this build didn't write or keep
+        """
+        for root, _, files in os.walk(self.output_dir, topdown=False):
+            for name in files:
+                filename = os.path.join(root, name)
+                if os.path.relpath(filename, self.output_dir) not in self.files:
+                    logger.debug("Removing stale %s", filename)
+                    os.remove(filename)
+                    self._sync.add(filename)
+            if root != self.output_dir and not os.listdir(root):
+                os.rmdir(root)
+                self._sync.add(root)
+
+    def sync(self) -> None:
+        """
+        fsync every directory written to or removed from, making the renames of this build durable
+        """
+        self._sync.sync()
+
+    def log_stats(self) -> None:
+        logger.info("Left %s unchanged files untouched", self.files_unchanged)
+        if not self.minify or self.bytes_rendered == 0:
+            return
+        saved = self.bytes_rendered - self.bytes_written
+        logger.info(
+            "Minified %s bytes to %s (saved %s bytes, %.1f%%) in %.3fs",
+            self.bytes_rendered,
+            self.bytes_written,
+            saved,
+            100 * saved / self.bytes_rendered,
+            self.minify_seconds,
+        )
@@ -2,57 +2,56 @@ import logging
 import os
 import shutil
 
-from .config import UNUSED
-from .config import UNUSED_IMAGES
-from .config import UNUSED_METADATA
-from .config import Config
+from .catalogue import Catalogue
+from .config import Site
+from .types import Config
 
 logger = logging.getLogger(__name__)
 
 
-def unused(conf: Config, new_image: str) -> bool:
+def unused(site: Site, conf: Config, new_image: str) -> bool:
     for date in conf.dates:
         if date.filename == new_image:
-            logger.error(f"{date.filename} is already used on {date.day}")
+            logger.error("%s is already used on %s", date.filename, date.day)
             return False
-        if os.path.exists(os.path.join(UNUSED_IMAGES, new_image)):
-            logger.error(f"{new_image} is already in {UNUSED_IMAGES}")
+        if os.path.exists(os.path.join(site.unused_images, new_image)):
+            logger.error("%s is already in %s", new_image, site.unused_images)
             return False
     return True
 
 
 def move(
+    site: Site,
+    catalogue: Catalogue,
     source_dir: str,
     name: str,
 ) -> int:
     _, ext = os.path.splitext(name)
     if ext != ".jpg":
         return 0
-    logger.info(f"Moving {source_dir}/{name} to {UNUSED_IMAGES}/{name}")
+    logger.info("Moving %s/%s to %s/%s", source_dir, name, site.unused_images, name)
     shutil.move(
         os.path.join(source_dir, name),
-        os.path.join(UNUSED_IMAGES, name),
+        os.path.join(site.unused_images, name),
     )
+    catalogue.queue_image(name)
 
     return 0
 
 
-def queue_images(*, conf: Config, source_dir: str) -> int:
+def queue_images(*, site: Site, conf: Config, catalogue: Catalogue, source_dir: str) -> int:
     if not os.path.exists(source_dir):
-        logger.error(f"Error: unable to list {source_dir}")
+        logger.error("Error: unable to list %s", source_dir)
         return 1
 
-    if not os.path.exists(UNUSED):
-        os.mkdir(UNUSED)
-    if not os.path.exists(UNUSED_IMAGES):
-        os.mkdir(UNUSED_IMAGES)
-    if not os.path.exists(UNUSED_METADATA):
-        os.mkdir(UNUSED_METADATA)
+    for dirname in (site.unused, site.unused_images, site.unused_metadata):
+        if not os.path.exists(dirname):
+            os.mkdir(dirname)
 
     with os.scandir(source_dir) as it:
         for entry in it:
-            if entry.is_file() and unused(conf, entry.name):
-                ret = move(source_dir, entry.name)
+            if entry.is_file() and unused(site, conf, entry.name):
+                ret = move(site, catalogue, source_dir, entry.name)
                 if ret != 0:
                     return ret
 
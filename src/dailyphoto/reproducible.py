@@ -0,0 +1,116 @@
+import datetime
+import hashlib
+import logging
+import os
+
+from jinja2 import Environment
+
+from .catalogue import Catalogue
+from .catalogue import file_mtime
+from .config import Site
+from .types import Config
+
+logger = logging.getLogger(__name__)
+
+# https://reproducible-builds.org/specs/source-date-epoch/
+SOURCE_DATE_EPOCH = "SOURCE_DATE_EPOCH"
+RESOURCES = os.path.join(os.path.dirname(__file__), "resources")
+# build options move every stamp back by up to this many seconds, see InputTimes
+OPTIONS_WINDOW = 3600
+
+
+def _valid(epoch: str) -> bool:
+    # the spec allows only ascii digits, isdigit alone accepts ie ²
+    return epoch.isascii() and epoch.isdigit()
+
+
+def source_date_epoch() -> int | None:
+    """
+    None when unset, or malformed which check_source_date_epoch reports
+    """
+    epoch = os.environ.get(SOURCE_DATE_EPOCH)
+    if epoch and _valid(epoch):
+        return int(epoch)
+    return None
+
+
+def set_source_date_epoch(epoch: str | None) -> None:
+    if epoch is None:
+        os.environ.pop(SOURCE_DATE_EPOCH, None)
+    else:
+        os.environ[SOURCE_DATE_EPOCH] = epoch
+
+
+def check_source_date_epoch() -> bool:
+    """
+    The spec asks builds to fail on a malformed SOURCE_DATE_EPOCH rather than ignore it
+    """
+    epoch = os.environ.get(SOURCE_DATE_EPOCH)
+    if epoch and not _valid(epoch):
+        logger.error("%s must be a whole number of seconds since 1970-01-01 UTC, not %r", SOURCE_DATE_EPOCH, epoch)
+        return False
+    return True
+
+
+def build_epoch(conf: Config) -> int:
+    """
+    SOURCE_DATE_EPOCH if set, otherwise midnight UTC of the latest day published
+    """
+    epoch = source_date_epoch()
+    if epoch is not None:
+        return epoch
+    latest = max(date.day for date in conf.dates)
+    return int(latest.replace(tzinfo=datetime.UTC).timestamp())
+
+
+class InputTimes:
+    """
+    When the inputs of each output file last changed, so a reproducible build can give every file an mtime
+    that moves when its inputs do, for rsync's quick check and the sitemap's lastmod, and stays put when they
+    don't. Clamped to SOURCE_DATE_EPOCH when it's set, as the spec asks.
+
+    A day page's inputs are its own and its neighbours' images and metadata plus the templates,
+    everything else depends on the whole site.
+
+    options are the build flags and derived values that change the output without touching a source file,
+    ie --minify or --optimize-images. They have no mtime, so their digest moves every stamp back by a
+    deterministic offset: changing them changes every mtime, and building with them again gives the same ones.
+    """
+
+    def __init__(
+        self,
+        *,
+        site: Site,
+        catalogue: Catalogue,
+        env: Environment,
+        extensions: tuple[str, ...],
+        options: str,
+    ) -> None:
+        self.site = site
+        self.catalogue = catalogue
+        self.clamp = source_date_epoch()
+        self.offset = int(hashlib.sha256(options.encode()).hexdigest(), 16) % OPTIONS_WINDOW
+        templates = [file_mtime(os.path.join(RESOURCES, name)) for name in env.list_templates(extensions=extensions)]
+        self.templates = max((mtime for mtime in templates if mtime is not None), default=0.0)
+        self._images: dict[str, float] = {}
+
+    def _stamp(self, mtime: float) -> int:
+        if self.clamp is not None:
+            mtime = min(mtime, self.clamp)
+        return int(mtime) - self.offset
+
+    def image(self, image: str) -> float:
+        if image not in self._images:
+            mtimes = (
+                self.catalogue.metadata_mtime(image),
+                file_mtime(os.path.join(self.site.images, image)),
+            )
+            self._images[image] = max((mtime for mtime in mtimes if mtime is not None), default=0.0)
+        return self._images[image]
+
+    def day(self, *images: str) -> int:
+        return self._stamp(max(self.templates, *(self.image(image) for image in images)))
+
+    def newest(self, conf: Config) -> int:
+        config_mtime = self.catalogue.config_mtime() or 0.0
+        return self._stamp(max(self.templates, config_mtime, *(self.image(date.filename) for date in conf.dates)))
@@ -1,4 +1,6 @@
 document.addEventListener('keydown', function(event) {
+  // don't navigate away while typing a search
+  if (event.target.tagName === 'INPUT') return;
   const key = event.key;
   if (key === 'ArrowLeft' || key === 'a' || key === 'h') {
     const leftArrow = document.querySelector('.arrow-left');
@@ -8,3 +10,72 @@ document.addEventListener('keydown', function(event) {
     if (rightArrow) rightArrow.click();
   }
 });
+
+// Search over the static index in /search, see search.py for the layout.
+// Every file is fetched at most once and only when a query needs it.
+const searchFiles = {};
+
+function searchFetch(name) {
+  if (!(name in searchFiles)) {
+    searchFiles[name] = fetch('/search/' + name).then(function(response) {
+      return response.ok ? response.json() : {};
+    });
+  }
+  return searchFiles[name];
+}
+
+// must match tokenize in search.py
+function searchTokens(text) {
+  return text.normalize('NFKD').replace(/[\u0300-\u036f]/g, '').toLowerCase().match(/[a-z0-9]+/g) || [];
+}
+
+async function search(query) {
+  const meta = await searchFetch('meta.json');
+  const terms = searchTokens(query).filter(function(term) { return term.length >= meta.prefix; });
+  if (terms.length === 0) return [];
+
+  let ids = null;
+  for (const term of terms) {
+    const key = term.slice(0, meta.prefix);
+    const shard = meta.shards.includes(key) ? await searchFetch(key + '.json') : {};
+    // every term is a prefix so results show up while typing
+    const matches = new Set();
+    for (const token in shard) {
+      if (token.startsWith(term)) shard[token].forEach(function(id) { matches.add(id); });
+    }
+    ids = ids === null ? matches : new Set([...ids].filter(function(id) { return matches.has(id); }));
+  }
+
+  // newest first
+  const results = [];
+  for (const id of [...ids].sort(function(a, b) { return b - a; }).slice(0, 60)) {
+    const docs = await searchFetch('docs-' + Math.floor(id / meta.chunk) + '.json');
+    results.push(docs[id % meta.chunk]);
+  }
+  return results;
+}
+
+const searchInput = document.getElementById('search');
+if (searchInput) {
+  const searchResults = document.getElementById('results');
+  let searchQuery = '';
+  searchInput.addEventListener('input', async function() {
+    const query = searchQuery = searchInput.value;
+    const results = await search(query);
+    // a newer query has started, let it render instead
+    if (query !== searchQuery) return;
+    searchResults.replaceChildren(...results.map(function([link, image, subtitle, date]) {
+      const item = document.createElement('div');
+      item.className = 'grid-item';
+      const anchor = document.createElement('a');
+      anchor.href = link;
+      const img = document.createElement('img');
+      img.src = image;
+      img.alt = subtitle;
+      img.title = subtitle + ', ' + date;
+      anchor.appendChild(img);
+      item.appendChild(anchor);
+      return item;
+    }));
+  });
+}
@@ -0,0 +1,148 @@
+import logging
+import random
+import sys
+from collections import defaultdict
+from collections import deque
+from datetime import datetime
+
+from pydantic import BaseModel
+
+from .types import Metadata
+from .types import MetadataEditable
+
+logger = logging.getLogger(__name__)
+
+# how many days before a film stock or camera may be used again
+DEFAULT_SPACING = 7
+
+
+class Candidate(BaseModel):
+    image: str
+    film: str = ""
+    camera: str = ""
+    year: int | None = None
+    complete: bool = False
+
+
+def candidate(image: str, metadata: Metadata | MetadataEditable | None) -> Candidate:
+    if metadata is None:
+        return Candidate(image=image)
+    year = metadata.date.year if isinstance(metadata.date, datetime) else None
+    return Candidate(
+        image=image,
+        film=metadata.film,
+        camera=metadata.camera,
+        year=year,
+        complete=bool(metadata.alt and metadata.camera and year and metadata.film and metadata.subtitle),
+    )
+
+
+class Group:
+    """
+    The queued images for one film and camera, bucketed by whether their metadata is complete and the year shot
+    """
+
+    def __init__(self, film: str, camera: str) -> None:
+        self.film = film
+        self.camera = camera
+        self.complete = 0
+        self.buckets: dict[tuple[bool, int | None], list[Candidate]] = defaultdict(list)
+
+    def add(self, candidate: Candidate) -> None:
+        self.buckets[(candidate.complete, candidate.year)].append(candidate)
+        self.complete += candidate.complete
+
+    def pop(self, key: tuple[bool, int | None]) -> Candidate:
+        bucket = self.buckets[key]
+        candidate = bucket.pop()
+        if not bucket:
+            del self.buckets[key]
+        self.complete -= candidate.complete
+        return candidate
+
+
+class Scheduler:
+    """
+    Picks queued images for consecutive days so that no film or camera repeats within spacing days,
+    the years shot are spread out and images with complete metadata go first.
+
+    Candidates are bucketed up front by film and camera, then by completeness and year, so each pick
+    only compares buckets rather than images.
+    """
+
+    def __init__(self, candidates: list[Candidate], *, spacing: int, rng: random.Random | None = None) -> None:
+        self.rng = rng or random.Random()
+        self.groups: dict[tuple[str, str], Group] = {}
+        for c in candidates:
+            group = self.groups.get((c.film, c.camera))
+            if group is None:
+                group = self.groups[(c.film, c.camera)] = Group(c.film, c.camera)
+            group.add(c)
+        for group in self.groups.values():
+            for bucket in group.buckets.values():
+                self.rng.shuffle(bucket)
+
+        self.recent: deque[Candidate] = deque(maxlen=spacing)
+        self.day = 0
+        # attribute -> day it was last used
+        self.film_used: dict[str, int] = {}
+        self.camera_used: dict[str, int] = {}
+        self.year_used: dict[int | None, int] = {}
+
+    def record(self, candidate: Candidate) -> None:
+        """
+        Count candidate as used on the next day, for published history and hand picked images
+        """
+        self.recent.append(candidate)
+        self.film_used[candidate.film] = self.day
+        self.camera_used[candidate.camera] = self.day
+        self.year_used[candidate.year] = self.day
+        self.day += 1
+
+    def _since(self, used: dict[str, int], value: str) -> int:
+        # unknown values never count as a repeat
+        if not value or value not in used:
+            return sys.maxsize
+        return self.day - used[value]
+
+    def pick(self) -> Candidate | None:
+        films = {c.film for c in self.recent if c.film}
+        cameras = {c.camera for c in self.recent if c.camera}
+
+        best = None
+        best_score = None
+        for group in self.groups.values():
+            allowed = group.film not in films and group.camera not in cameras
+            score = (
+                allowed,
+                group.complete > 0,
+                min(self._since(self.film_used, group.film), self._since(self.camera_used, group.camera)),
+                self.rng.random(),
+            )
+            if best_score is None or score > best_score:
+                best, best_score = group, score
+        if best is None or best_score is None:
+            return None
+        if not best_score[0]:
+            logger.warning(
+                "Repeating %s / %s within %s days, nothing else left", best.film, best.camera, self.recent.maxlen
+            )
+
+        def year_score(key: tuple[bool, int | None]) -> tuple[bool, int]:
+            complete, year = key
+            return complete, self.day - self.year_used[year] if year in self.year_used else sys.maxsize
+
+        candidate = best.pop(max(best.buckets, key=year_score))
+        if not best.buckets:
+            del self.groups[(best.film, best.camera)]
+        self.record(candidate)
+        return candidate
+
+    def plan(self, count: int) -> list[Candidate]:
+        planned = []
+        for _ in range(count):
+            candidate = self.pick()
+            if candidate is None:
+                break
+            planned.append(candidate)
+        return planned
@@ -0,0 +1,62 @@
+import json
+import re
+import unicodedata
+from collections import defaultdict
+
+from .output import Output
+from .types import Metadata
+
+SEARCH_DIR = "search"
+# Tokens are sharded by their first characters, so a query only fetches the shards for its words
+SHARD_PREFIX = 2
+# Number of documents per docs-N.json file
+DOC_CHUNK = 500
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase, strip accents and split into words. main.js does the same to queries.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _WORD.findall(text.lower())
+
+
+class SearchIndex:
+    """
+    Static inverted index over the photo metadata, written as JSON shards the browser fetches on demand
+    """
+
+    def __init__(self) -> None:
+        # [link, image, subtitle, date] for each document, the position is the document id
+        self.docs: list[list[str]] = []
+        self.tokens: dict[str, set[int]] = defaultdict(set)
+
+    def add(self, link: str, image: str, date: str, metadata: Metadata) -> None:
+        doc_id = len(self.docs)
+        self.docs.append([link, image, metadata.subtitle, date])
+        for field in (metadata.film, metadata.camera, metadata.subtitle, metadata.alt, date):
+            for token in tokenize(field):
+                # queries need at least a full shard prefix to pick a shard
+                if len(token) >= SHARD_PREFIX:
+                    self.tokens[token].add(doc_id)
+
+    def write(self, output: Output) -> None:
+        shards: dict[str, dict[str, list[int]]] = defaultdict(dict)
+        for token, doc_ids in self.tokens.items():
+            shards[token[:SHARD_PREFIX]][token] = sorted(doc_ids)
+
+        for key, shard in shards.items():
+            output.write(f"{SEARCH_DIR}/{key}.json", json.dumps(shard, sort_keys=True, separators=(",", ":")))
+
+        for start in range(0, len(self.docs), DOC_CHUNK):
+            output.write(
+                f"{SEARCH_DIR}/docs-{start // DOC_CHUNK}.json",
+                json.dumps(self.docs[start : start + DOC_CHUNK], separators=(",", ":")),
+            )
+
+        # lets the browser skip requests for shards that don't exist
+        meta = {"prefix": SHARD_PREFIX, "chunk": DOC_CHUNK, "shards": sorted(shards)}
+        output.write(f"{SEARCH_DIR}/meta.json", json.dumps(meta, separators=(",", ":")))
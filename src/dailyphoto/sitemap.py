@@ -0,0 +1,73 @@
+import datetime
+import os
+import time
+
+from jinja2 import Environment
+from pydantic import BaseModel
+
+from .output import Output
+from .output import read_page_state
+from .output import write_page_state
+
+# the sitemap protocol's limit per file, past it sitemap.xml becomes an index of shards
+MAX_URLS = 50000
+
+
+class SitemapUrl(BaseModel):
+    loc: str
+    lastmod: str
+
+
+def page_url(base_url: str, name: str) -> str:
+    if name == "index.html":
+        return f"{base_url}/"
+    return f"{base_url}/{name}"
+
+
+def w3c_datetime(timestamp: float) -> str:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.UTC).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def lastmods(output: Output, state_file: str) -> dict[str, str]:
+    """
+    Page name -> when its content last changed, recorded in state_file from build to build:
+    pages this build changed or added get the build's time, the rest keep what was recorded.
+    A reproducible build uses the mtime each page was given from its inputs instead.
+    """
+    pages = sorted(name for name in output.files if name.endswith(".html"))
+    recorded = read_page_state(state_file)
+    now = w3c_datetime(time.time())
+    result = {}
+    for name in pages:
+        filename = output.path(name)
+        if output.mtime is not None:
+            result[name] = w3c_datetime(os.stat(filename).st_mtime)
+        elif filename in output.changed or name not in recorded:
+            result[name] = now
+        else:
+            result[name] = recorded[name]
+    write_page_state(state_file, result)
+    return result
+
+
+def write_sitemap(env: Environment, output: Output, base_url: str, state_file: str) -> None:
+    """
+    Write sitemap.xml listing every page of this build under base_url, call once all the pages are written
+    """
+    urls = [
+        SitemapUrl(loc=page_url(base_url, name), lastmod=lastmod)
+        for name, lastmod in lastmods(output, state_file).items()
+    ]
+
+    if len(urls) <= MAX_URLS:
+        output.write("sitemap.xml", env.get_template("sitemap.xml").render(urls=urls))
+    else:
+        shards = []
+        for i, start in enumerate(range(0, len(urls), MAX_URLS)):
+            name = f"sitemap-{i + 1}.xml"
+            shard = urls[start : start + MAX_URLS]
+            output.write(name, env.get_template("sitemap.xml").render(urls=shard))
+            shards.append(SitemapUrl(loc=page_url(base_url, name), lastmod=max(url.lastmod for url in shard)))
+        output.write("sitemap.xml", env.get_template("sitemapindex.xml").render(sitemaps=shards))
+
+    output.write("robots.txt", f"User-agent: *\nAllow: /\n\nSitemap: {base_url}/sitemap.xml\n")
@@ -2,6 +2,7 @@ from datetime import datetime
 from typing import Annotated
 
 from annotated_types import Len
+from pydantic import AfterValidator
 from pydantic import BaseModel
 from pydantic import BeforeValidator
 from pydantic import ConfigDict
@@ -13,7 +14,11 @@ ShortDatetime = Annotated[
     PlainSerializer(lambda dt: dt.strftime("%Y%m%d") if dt else ""),
 ]
 
+DEFAULT_BASE_URL = "https://daily.photo"
 
+
+# Every command reads the config so Date and Config are built on import, the other models
+# use defer_build to build their validators on first use, keeping them off the startup path.
 class Date(BaseModel):
     day: ShortDatetime
     filename: Annotated[str, Len(min_length=1)]
@@ -21,6 +26,8 @@ class Date(BaseModel):
 
 class Config(BaseModel):
     dates: list[Date]
+    # where the site is published, for the absolute links in the feed, sitemap and social cards
+    base_url: Annotated[str, AfterValidator(lambda url: url.rstrip("/"))] = DEFAULT_BASE_URL
 
 
 class MetadataEditable(BaseModel):
@@ -29,7 +36,7 @@ class MetadataEditable(BaseModel):
     Used for adding + editing images when fields might be unset
     """
 
-    model_config = ConfigDict(extra="allow")
+    model_config = ConfigDict(extra="allow", defer_build=True)
     alt: str = ""
     camera: str = ""
     date: ShortDatetime | str | None = None
@@ -43,9 +50,23 @@ class Metadata(BaseModel):
     Used for validation and generation to ensure that all fields are filled in and have certain properties.
     """
 
-    model_config = ConfigDict(extra="forbid")
+    model_config = ConfigDict(extra="forbid", defer_build=True)
     alt: Annotated[str, Len(min_length=1)]
     camera: Annotated[str, Len(min_length=1)]
     date: ShortDatetime
     film: Annotated[str, Len(min_length=1)]
     subtitle: Annotated[str, Len(min_length=1)]
+
+
+class MonthlyImage(BaseModel):
+    """
+    A thumbnail linking to a day page, as shown on the month and facet grids
+    """
+
+    model_config = ConfigDict(defer_build=True)
+
+    link: str
+    file: str
+    alt: str
+    width: int
+    height: int
@@ -1,17 +1,16 @@
 import logging
 import os
 
-from .config import IMAGES
-from .config import METADATA_DIR
-from .config import Config
-from .metadata import get_metadata_filename
-from .metadata import read_metadata
+from .catalogue import Catalogue
+from .config import Site
+from .types import Config
 
 logger = logging.getLogger(__name__)
 
 
-def validate(*, conf: Config) -> int:
+def validate(*, site: Site, conf: Config, catalogue: Catalogue) -> int:
     dates = conf.dates
+    images = site.images
 
     if dates is None or len(dates) == 0:
         logger.error("No dates set in config")
@@ -23,36 +22,35 @@ def validate(*, conf: Config) -> int:
     for date in dates:
         # Check for duplicate dates
         if date.day in date_set:
-            logger.error(f"{date.day} exists more than once.")
+            logger.error("%s exists more than once.", date.day)
             ret += 1
         date_set.add(date.day)
 
         # Check for dupes in the filenames
         if date.filename in config_files:
-            logger.error(f"Entry {date}: {date.filename} is duplicate")
+            logger.error("Entry %s: %s is duplicate", date, date.filename)
             ret += 1
         config_files.add(date.filename)
 
-        if not os.path.exists(os.path.join(IMAGES, date.filename)):
-            logger.error(f"Entry {date}: {date.filename} missing jpg")
+        if not os.path.exists(os.path.join(images, date.filename)):
+            logger.error("Entry %s: %s missing jpg", date, date.filename)
             ret += 1
 
-        metadata_file = get_metadata_filename(METADATA_DIR, date.filename)
-        metadata = read_metadata(metadata_file)
+        metadata = catalogue.read_metadata(date.filename)
 
         if metadata is None:
             ret += 1
-            logger.error(f"Entry {date} unable to load {metadata_file}")
+            logger.error("Entry %s unable to load metadata", date)
             continue
 
     disk_files = set()
-    for root, dirs, files in os.walk(IMAGES):
-        if root != IMAGES:
-            logger.error(f"{IMAGES} contains unknown dir {root}")
+    for root, dirs, files in os.walk(images):
+        if root != images:
+            logger.error("%s contains unknown dir %s", images, root)
             ret += 1
 
         if len(dirs) != 0:
-            logger.error(f"extra dirs detected see {dirs}")
+            logger.error("extra dirs detected see %s", dirs)
             ret += 1
 
         for file in files:
@@ -60,10 +58,10 @@ def validate(*, conf: Config) -> int:
 
     diff = config_files.difference(disk_files)
     if len(diff) != 0:
-        logger.error(f"Missing images in config_files {diff}")
+        logger.error("Missing images in config_files %s", diff)
 
     diff = disk_files.difference(config_files)
     if len(diff) != 0:
-        logger.error(f"Unexpected files on disk: {diff}")
+        logger.error("Unexpected files on disk: %s", diff)
 
     return ret
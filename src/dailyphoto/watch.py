@@ -5,15 +5,20 @@ from watchdog.events import FileSystemEvent
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
+from .catalogue import Catalogue
+from .catalogue import open_catalogue
+from .config import Site
 from .generate import generate
-from .types import Config
 
 logger = logging.getLogger(__name__)
 
 
 class WatchHandler(FileSystemEventHandler):
-    def __init__(self, conf: Config):
-        self.conf = conf
+    def __init__(self, site: Site, config_file: str):
+        self.site = site
+        self.config_file = config_file
+        # opened on the observer thread that uses it, a sqlite connection can't move between threads
+        self.catalogue: Catalogue | None = None
 
         # Debounce update events to 1 second
         self._last_run = time.monotonic() - 1
@@ -21,15 +26,20 @@ class WatchHandler(FileSystemEventHandler):
     def on_any_event(self, event: FileSystemEvent) -> None:
         now = time.monotonic()
         if now - self._last_run >= 1:
-            logger.info(f"Processing {event}")
-            generate(conf=self.conf, tar=False)
+            logger.info("Processing %s", event)
+            if self.catalogue is None:
+                self.catalogue = open_catalogue(self.config_file, self.site)
+            # re-read so dates added while watching are built
+            conf = self.catalogue.read_config()
+            if conf is not None:
+                generate(site=self.site, conf=conf, catalogue=self.catalogue, tar=False)
             self._last_run = now
         else:
-            logger.debug(f"Skipping event {event} (rate limited)")
+            logger.debug("Skipping event %s (rate limited)", event)
 
 
-def watch(*, conf: Config, path: str) -> int:
-    event_handler = WatchHandler(conf)
+def watch(*, site: Site, config_file: str, path: str) -> int:
+    event_handler = WatchHandler(site, config_file)
     observer = Observer()
     observer.schedule(event_handler, path, recursive=True)
     observer.start()
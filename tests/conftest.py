@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+DAYS = ["20220601", "20220602", "20220603"]
+
+
+@pytest.fixture
+def site(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    A small site in the default layout with a published image per day, as the current directory
+    """
+    images = tmp_path / "current" / "images"
+    metadata = tmp_path / "current" / "metadata"
+    images.mkdir(parents=True)
+    metadata.mkdir(parents=True)
+    dates = []
+    for i, day in enumerate(DAYS):
+        # a dot in the stem, like IMG.1234.jpg, must not be taken for the extension
+        filename = f"IMG.{1000 + i}.jpg"
+        Image.new("RGB", (64, 48), (40 * i, 100, 200)).save(images / filename, quality=95)
+        fields = {
+            "alt": f"Photo {i}",
+            "camera": "Olympus XA",
+            "date": day,
+            "film": "Kodak Portra 400",
+            "subtitle": f"Day {i}",
+        }
+        (metadata / f"IMG.{1000 + i}.json").write_text(json.dumps(fields))
+        dates.append({"day": day, "filename": filename})
+    (tmp_path / "config.json").write_text(json.dumps({"dates": dates}))
+    # the default layout is relative to the current directory
+    monkeypatch.chdir(tmp_path)
+    # and builds outside a daemon
+    monkeypatch.delenv("SOURCE_DATE_EPOCH", raising=False)
+    return tmp_path
@@ -0,0 +1,32 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from dailyphoto.cli import main
+
+
+def test_sqlite_round_trip(site: Path, tmp_path_factory: pytest.TempPathFactory) -> None:
+    """
+    Importing into SQLite and exporting again gives back the same config and metadata files
+    """
+    db_file = tmp_path_factory.mktemp("db") / "catalogue.sqlite"
+    metadata_dir = site / "current" / "metadata"
+    before = {file.name: json.loads(file.read_text()) for file in metadata_dir.iterdir()}
+    config = json.loads((site / "config.json").read_text())
+
+    assert main(["--no-daemon", "catalogue", "import", str(db_file)]) == 0
+    for file in metadata_dir.iterdir():
+        file.unlink()
+    (site / "config.json").unlink()
+    assert main(["--no-daemon", "catalogue", "export", str(db_file)]) == 0
+
+    assert {file.name: json.loads(file.read_text()) for file in metadata_dir.iterdir()} == before
+    assert json.loads((site / "config.json").read_text()) == config
+
+
+def test_sqlite_generate(site: Path, tmp_path_factory: pytest.TempPathFactory) -> None:
+    db_file = tmp_path_factory.mktemp("db") / "catalogue.sqlite"
+    assert main(["--no-daemon", "catalogue", "import", str(db_file)]) == 0
+    assert main(["--no-daemon", "--config-file", str(db_file), "generate", "--no-tar"]) == 0
+    assert "Day 1" in (site / "generated" / "20220602.html").read_text()
@@ -0,0 +1,29 @@
+from dailyphoto.metrics import BuildMetrics
+from dailyphoto.metrics import prometheus
+
+
+def metrics(site: str) -> BuildMetrics:
+    return BuildMetrics(
+        site=site,
+        seconds=2.0,
+        pages=10,
+        files=12,
+        files_written=3,
+        bytes_written=400,
+        cache_hits={"page": 9},
+        cache_misses={"page": 1},
+        errors=0,
+    )
+
+
+def test_prometheus() -> None:
+    text = prometheus([metrics("generated")])
+    assert "# TYPE dailyphoto_pages gauge\n" in text
+    assert 'dailyphoto_pages{site="generated"} 10\n' in text
+    assert 'dailyphoto_cache_hits{site="generated",cache="page"} 9\n' in text
+
+
+def test_prometheus_escapes_labels() -> None:
+    text = prometheus([metrics('C:\\sites\\"quoted"\nnext')])
+    assert 'dailyphoto_pages{site="C:\\\\sites\\\\\\"quoted\\"\\nnext"} 10\n' in text
+    assert len(text.splitlines()) == len(prometheus([metrics("generated")]).splitlines())
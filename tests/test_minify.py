@@ -0,0 +1,73 @@
+import pytest
+
+from dailyphoto.generate import environment
+from dailyphoto.minify import minify
+from dailyphoto.minify import minify_css
+from dailyphoto.minify import minify_html
+from dailyphoto.minify import minify_js
+
+
+def test_html_collapses_whitespace() -> None:
+    html = "<html>\n  <body>\n    <!-- gone -->\n    <p>one   <em>two</em>\n three</p>\n  </body>\n</html>\n"
+    assert minify_html(html) == "<html><body><p>one <em>two</em> three</p></body></html>\n"
+
+
+def test_html_keeps_conditional_comments() -> None:
+    assert "<!--[if IE]>" in minify_html("<p>a</p>\n<!--[if IE]><p>old</p><![endif]-->\n")
+
+
+@pytest.mark.parametrize("tag", ["pre", "textarea"])
+def test_html_preserves_whitespace_in(tag: str) -> None:
+    body = "  first\n\n    indented  <!-- not a comment here -->\n"
+    html = f"<div>\n  <{tag} class='x'>{body}</{tag}>\n</div>\n"
+    assert f"<{tag} class='x'>{body}</{tag}>" in minify_html(html)
+
+
+def test_html_script_keeps_lines_and_strings() -> None:
+    html = """<body>
+  <script>
+    // a comment
+    const url = "https://daily.photo/   spaced   ";
+    if (a < b)
+      go(url)
+  </script>
+</body>
+"""
+    assert minify_html(html) == (
+        '<body><script>const url = "https://daily.photo/   spaced   ";\nif (a < b)\ngo(url)</script></body>\n'
+    )
+
+
+def test_js_keeps_strings() -> None:
+    js = """
+    const a = "  // not a comment  ";
+    const b = 'it\\'s `quoted`';
+    const c = `line one
+      // still the template
+        indented`;
+    """
+    minified = minify_js(js)
+    assert '"  // not a comment  "' in minified
+    assert "'it\\'s `quoted`'" in minified
+    assert "`line one\n      // still the template\n        indented`" in minified
+
+
+def test_css_keeps_strings() -> None:
+    css = """
+    /* a comment */
+    .a::before {
+      content: "  a ; { b }  /* not a comment */ ";
+      font-family: 'Roboto  Condensed', serif;
+    }
+    """
+    assert minify_css(css) == (
+        """.a::before{content:"  a ; { b }  /* not a comment */ ";font-family:'Roboto  Condensed',serif}"""
+    )
+
+
+@pytest.mark.parametrize("name", ["main.css", "month.css", "main.js", "search.html"])
+def test_idempotent(name: str) -> None:
+    content = environment().get_template(name).render(assets={"main.css": "", "main.js": ""}, archive="")
+    once = minify(name, content)
+    assert len(once) < len(content)
+    assert minify(name, once) == once
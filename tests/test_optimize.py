@@ -0,0 +1,65 @@
+import io
+from pathlib import Path
+
+from PIL import Image
+from PIL import ImageCms
+from PIL.ExifTags import Base
+
+from dailyphoto.cli import main
+from dailyphoto.optimize import optimize_image
+from dailyphoto.optimize import strip_jpeg
+
+
+def jpeg(*, orientation: int = 1, progressive: bool = False) -> bytes:
+    image = Image.new("RGB", (64, 48), (200, 100, 50))
+    image.paste((10, 20, 30), (0, 0, 32, 24))
+    exif = Image.Exif()
+    exif[Base.Make] = "Olympus"
+    exif[Base.Orientation] = orientation
+    icc_profile = ImageCms.ImageCmsProfile(ImageCms.createProfile("sRGB")).tobytes()
+    f = io.BytesIO()
+    image.save(f, "JPEG", exif=exif, icc_profile=icc_profile, comment=b"a comment", progressive=progressive)
+    return f.getvalue()
+
+
+def test_strip_jpeg_is_lossless() -> None:
+    data = jpeg(progressive=True)
+    stripped = strip_jpeg(data)
+    assert stripped is not None
+    assert len(stripped) < len(data)
+
+    with Image.open(io.BytesIO(data)) as original, Image.open(io.BytesIO(stripped)) as copy:
+        assert copy.tobytes() == original.tobytes()
+        assert copy.info["icc_profile"] == original.info["icc_profile"]
+        assert "exif" not in copy.info
+        assert "comment" not in copy.info
+        assert copy.info.get("progressive")
+
+
+def test_strip_jpeg_not_a_jpeg() -> None:
+    assert strip_jpeg(b"\x89PNG\r\n\x1a\n") is None
+
+
+def test_lossless_rotated_falls_back(tmp_path: Path) -> None:
+    source = tmp_path / "source.jpg"
+    source.write_bytes(jpeg(orientation=6))
+    dest = tmp_path / "dest.jpg"
+    optimize_image(str(source), str(dest), "lossless", None)
+    with Image.open(dest) as copy:
+        # the orientation was applied to the pixels, as it's stripped with the rest of the EXIF
+        assert copy.size == (48, 64)
+        assert "exif" not in copy.info
+
+
+def test_stale_copies_are_pruned(site: Path) -> None:
+    optimized = site / ".dailyphoto-cache" / "images"
+    assert main(["--no-daemon", "generate", "--no-tar", "--optimize-images", "--image-quality", "lossless"]) == 0
+    first = set(optimized.iterdir())
+    assert len(first) == 3
+    assert main(["--no-daemon", "generate", "--no-tar", "--optimize-images", "--image-quality", "80"]) == 0
+    second = set(optimized.iterdir())
+    assert len(second) == 3
+    assert not first & second
+    # the originals are published again, nothing links to the copies
+    assert main(["--no-daemon", "generate", "--no-tar"]) == 0
+    assert list(optimized.iterdir()) == []
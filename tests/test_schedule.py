@@ -0,0 +1,67 @@
+import logging
+import random
+
+import pytest
+
+from dailyphoto.schedule import Candidate
+from dailyphoto.schedule import Scheduler
+
+FILMS = ["Kodak Portra 400", "Ilford HP5", "Fuji Superia 200", "Kodak Gold 200"]
+CAMERAS = ["Olympus XA", "Nikon FM2", "Canon AE-1", "Pentax MX", "Leica M6"]
+
+
+def candidates(count: int) -> list[Candidate]:
+    return [
+        Candidate(
+            image=f"IMG.{1000 + i}",
+            film=FILMS[i % len(FILMS)],
+            camera=CAMERAS[i % len(CAMERAS)],
+            year=2000 + i % 3,
+            complete=i % 2 == 0,
+        )
+        for i in range(count)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_spacing(seed: int, caplog: pytest.LogCaptureFixture) -> None:
+    spacing = 3
+    planned = Scheduler(candidates(60), spacing=spacing, rng=random.Random(seed)).plan(20)
+    assert len(planned) == 20
+    for day, picked in enumerate(planned):
+        for earlier in planned[max(0, day - spacing) : day]:
+            assert picked.film != earlier.film
+            assert picked.camera != earlier.camera
+    assert "Repeating" not in caplog.text
+
+
+def test_spacing_counts_history() -> None:
+    scheduler = Scheduler(candidates(20), spacing=2, rng=random.Random(0))
+    scheduler.record(Candidate(image="published", film=FILMS[0], camera=CAMERAS[0]))
+    picked = scheduler.pick()
+    assert picked is not None
+    assert picked.film != FILMS[0]
+    assert picked.camera != CAMERAS[0]
+
+
+def test_complete_first() -> None:
+    planned = Scheduler(candidates(40), spacing=1, rng=random.Random(0)).plan(20)
+    assert all(c.complete for c in planned)
+
+
+def test_unsatisfiable_falls_back(caplog: pytest.LogCaptureFixture) -> None:
+    same = [Candidate(image=f"IMG.{i}", film=FILMS[0], camera=CAMERAS[0]) for i in range(3)]
+    with caplog.at_level(logging.WARNING, logger="dailyphoto.schedule"):
+        planned = Scheduler(same, spacing=7, rng=random.Random(0)).plan(5)
+    assert sorted(c.image for c in planned) == ["IMG.0", "IMG.1", "IMG.2"]
+    repeats = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(repeats) == 2
+    assert f"Repeating {FILMS[0]} / {CAMERAS[0]} within 7 days" in repeats[0].getMessage()
+
+
+def test_deterministic() -> None:
+    def plan(seed: int) -> list[str]:
+        return [c.image for c in Scheduler(candidates(60), spacing=3, rng=random.Random(seed)).plan(30)]
+
+    assert plan(42) == plan(42)
+    assert plan(42) != plan(43)
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+# cumulative import time of the dailyphoto modules, in microseconds. about 50ms on a laptop,
+# leaving room for slower CI machines while still catching a heavy dependency imported at startup
+STARTUP_BUDGET_US = 150_000
+HEAVY_MODULES = ("jinja2", "PIL", "pydantic")
+
+
+def import_times(args: list[str], cwd: Path) -> dict[str, int]:
+    """
+    Run dailyphoto with -X importtime and return module -> cumulative import time in microseconds.
+    Modules imported by other modules are indented by importtime, their names keep the indent.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC, os.environ.get("PYTHONPATH")])))
+    # the first run may have to compile the bytecode, time the second
+    for _ in range(2):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-m", "dailyphoto", "--no-daemon", *args],
+            cwd=cwd,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=False,
+        )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        times[module.removeprefix(" ")] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize(
+    ("args", "allowed"),
+    [
+        (["--help"], ()),
+        # reading EXIF needs Pillow, but not templates or models
+        (["exif", "missing.jpg"], ("PIL",)),
+        # validate runs on every commit. These stop at the missing config, so this is what they pay
+        # before reading any data, the models are imported once there is some
+        (["validate"], ()),
+        (["new"], ()),
+        (["queue", "missing"], ()),
+    ],
+)
+def test_startup(tmp_path: Path, args: list[str], allowed: tuple[str, ...]) -> None:
+    # in an empty directory, so no daemon is found and the command runs here
+    times = import_times(args, tmp_path)
+    assert "dailyphoto.cli" in times
+
+    modules = {module.strip() for module in times}
+    imported = [module for module in HEAVY_MODULES if module in modules and module not in allowed]
+    assert imported == [], f"dailyphoto {' '.join(args)} imported {imported}"
+
+    # the top level dailyphoto imports, which include everything they import
+    total = sum(cumulative for module, cumulative in times.items() if module.startswith("dailyphoto"))
+    assert total <= STARTUP_BUDGET_US, f"dailyphoto {' '.join(args)} took {total}us to import"